@@ -0,0 +1,60 @@
+""" Compares TweetCleaner against the original chain of regex passes and checks the outputs are identical.
+
+    Usage: python -m benchmarks.clean_benchmark
+"""
+import re
+from benchmarks import timing
+from src import constants, util
+from src.preprocessing import text as prepro_text
+
+
+def chained_replace_smileys(text):
+    def re_sub(pattern, repl):
+        return re.sub(pattern, repl, text, flags=prepro_text.FLAGS)
+
+    loleyes = r"[8:=;]"
+    eyes = r"[8:=;Xx]"
+    nose = r"['`^\-0Oo]?"
+
+    text = re_sub(r"\B{}{}[)D]+|[(D]+{}{}".format(eyes, nose, nose, eyes), ' -smile- ')
+    text = re_sub(r"\B{}{}[pPbB]+".format(loleyes, nose), ' -lolface- ')
+    text = re_sub(r"\B{}{}[(?]+|\)+{}{}".format(eyes, nose, nose, eyes), ' -sadface- ')
+    text = re_sub(r"\B{}{}[\/\\|l]".format(eyes, nose), ' -neutralface- ')
+    text = re_sub(r"\B{}{}[*]".format(eyes, nose), ' -kisses- ')
+    text = re.sub(r'(\b([Xx][Oo]){1,}\b)|(\b[Xx]{2,}\b)|(\b[Xx]$)', ' -kisses- ', text)
+    return text
+
+
+def chained_clean(text):
+    """ The original clean() implementation, one re.sub pass per rule. """
+    text = prepro_text.word_split.sub(' ', text)
+    text = prepro_text.space_before.sub(r' \1', text)
+    text = prepro_text.elipsiss.sub(r' \1 ', text)
+    text = prepro_text.apostrophe_like.sub(r' \1', text)
+    text = prepro_text.space_before_paren.sub(r'\1 \2', text)
+    text = prepro_text.space_after_paren.sub(r'\1 \2', text)
+    text = prepro_text.emoji_regex.sub('', text)
+    text = prepro_text.normalize(text)
+    text = re.sub(r'#', ' #', text)
+    text = prepro_text.hashtag_regex.sub(prepro_text.hashtag, text)
+    text = chained_replace_smileys(text)
+    text = prepro_text.double_punct.sub(r'\1 \2', text)
+    text = prepro_text.multi_spaces.sub(' ', text)
+    text = text.strip()
+    return text
+
+
+def main():
+    tweets = util.concat_load_tsvs(constants.FilePaths.SEM_EVAL)['text'].tolist()
+    cleaner = prepro_text.TweetCleaner()
+
+    mismatches = [tweet for tweet in tweets if chained_clean(tweet) != cleaner.clean(tweet)]
+    print('Checked {} tweets, {} mismatches.'.format(len(tweets), len(mismatches)))
+
+    before = timing.throughput(chained_clean, tweets)
+    after = timing.throughput(cleaner.clean, tweets)
+    timing.report('clean', before, after)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+""" Compares float32, float16 and int8 quantized storage of the word embedding matrix: file size, load time, resident
+    memory, lookup time and how closely the stored vectors match the float32 vectors.
+
+    Reads the word_embeddings.npy file given as the first argument, or the one saved by preprocess for the defaults.
+
+    Usage: python -m benchmarks.embedding_storage_benchmark [path]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from src import constants, util
+
+
+def best_time(fn, repeats=3):
+    """ Returns the fastest wall time of calling fn over a number of repeats. """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def lookup(matrix, ids):
+    """ Gathers rows and widens them to float32 in the same order as CompressedEmbedding. """
+    if util.is_quantized(matrix):
+        rows = matrix[ids]
+        return rows['values'].astype(np.float32) * rows['scale'][:, None]
+    return matrix[ids].astype(np.float32)
+
+
+def main():
+    if len(sys.argv) > 1:
+        path = sys.argv[1]
+    else:
+        path = util.embedding_paths(util.namespace_json(constants.FilePaths.DEFAULTS))[0]
+
+    matrix = util.dequantize_embeddings(np.load(path))
+    ids = np.random.randint(0, len(matrix), size=(256 * 50, ))
+    # Padding and trainable words are all-zeros, leave them out of the cosine similarity.
+    norms = np.linalg.norm(matrix, axis=1)
+    nonzero = norms > 0
+
+    encoders = {
+        constants.EmbeddingDtypes.FLOAT32: lambda m: m.astype(np.float32),
+        constants.EmbeddingDtypes.FLOAT16: lambda m: m.astype(np.float16),
+        constants.EmbeddingDtypes.INT8: util.quantize_embeddings,
+    }
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for dtype, encode in encoders.items():
+            stored_path = os.path.join(tmp_dir, '{}.npy'.format(dtype))
+            np.save(stored_path, encode(matrix))
+            load_time = best_time(lambda: np.load(stored_path))
+            stored = np.load(stored_path)
+            lookup_time = best_time(lambda: lookup(stored, ids))
+
+            restored = util.dequantize_embeddings(stored)
+            error = np.abs(restored - matrix).max()
+            cosine = (restored * matrix).sum(axis=1)[nonzero] / (
+                np.linalg.norm(restored, axis=1)[nonzero] * norms[nonzero])
+
+            print('{dtype}: {size:.1f} MB on disk, {memory:.1f} MB in memory, load {load:.3f}s, '
+                  'lookup {lookup:.4f}s, max abs error {error:.5f}, min cosine {cosine:.6f}'.format(
+                      dtype=dtype, size=os.path.getsize(stored_path) / (1024 * 1024),
+                      memory=stored.nbytes / (1024 * 1024), load=load_time, lookup=lookup_time, error=error,
+                      cosine=cosine.min() if len(cosine) > 0 else 1.0))
+            del stored
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+""" Compares the parallel chunked embeddings parser against read_embeddings_file and checks the vectors are identical.
+
+    Reads the embeddings file given as the first argument, or the embeddings_path in the defaults.
+
+    Usage: python -m benchmarks.embeddings_benchmark [path]
+"""
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+from src import constants, util
+from src.util import embeddings
+
+
+def timed(fn, *args, repeats=3, **kwargs):
+    """ Returns the result of fn and its fastest wall time over a number of repeats. """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else util.namespace_json(constants.FilePaths.DEFAULTS).embeddings_path
+    embedding_index, before = timed(util.read_embeddings_file, path)
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        vectors_path = os.path.join(tmp_dir, constants.FileNames.EMBEDDING_VECTORS)
+
+        for num_workers in sorted({1, os.cpu_count()}):
+            words, after = timed(embeddings.parse_embeddings_file, path, vectors_path, num_workers=num_workers)
+            vectors = np.load(vectors_path, mmap_mode='r')
+            # The last vector seen for a duplicated word is the one kept by read_embeddings_file.
+            rows = {word: row for row, word in enumerate(words)}
+            mismatches = sum(1 for word, vector in embedding_index.items()
+                             if word not in rows or not np.array_equal(vectors[rows[word]], vector))
+            print('Checked {} words, {} mismatches.'.format(len(embedding_index), mismatches))
+            print('parse {workers} worker(s): before {before:.2f}s, after {after:.2f}s, {rate:,.0f} MB/sec '
+                  '({speedup:.2f}x)'.format(workers=num_workers, before=before, after=after, rate=size_mb / after,
+                                            speedup=before / after))
+            del vectors
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+""" Checks demo mode can serve a pruned export: trains one step of a small attention model on a full word matrix and
+    saves a checkpoint, then builds the model from a pruned word matrix and restores that checkpoint with demo's saver.
+
+    Passes if the restore succeeds, the word embeddings keep the pruned values they were initialized with and the
+    trainable + char embeddings hold the moving averages saved in the checkpoint.
+
+    Usage: python -m benchmarks.export_restore_check
+"""
+import os
+import tempfile
+import numpy as np
+import tensorflow as tf
+from src import constants, export_utils, models, train_utils, util
+
+NUM_WORDS = 200
+NUM_CHARS = 30
+NUM_CLASSES = 2
+NUM_TAGS = 5
+
+
+def create_params():
+    params = util.namespace_json(constants.FilePaths.DEFAULTS)
+    params.embed_dim = 16
+    params.char_dim = 8
+    params.hidden_units = 8
+    params.cudnn = False
+    return params
+
+
+def build_model(params, word_matrix, char_matrix, trainable_matrix):
+    """ Builds an attention model on placeholders and returns the model, its logits and the input placeholders. """
+    inputs = {
+        'words': tf.placeholder(shape=(None, None, ), dtype=tf.int32, name='words'),
+        'chars': tf.placeholder(shape=(None, None, None, ), dtype=tf.int32, name='chars'),
+        'tags': tf.placeholder(shape=(None, None, NUM_TAGS), dtype=tf.float32, name='tags'),
+        'num_tokens': tf.placeholder(shape=(None, ), dtype=tf.int32, name='num_tokens'),
+    }
+    model = models.AttentionModel(word_matrix, char_matrix, trainable_matrix, NUM_CLASSES, params)
+    logits, _, _ = model(inputs, training=False)
+    return model, logits, inputs
+
+
+def main():
+    params = create_params()
+    trainable_words = params.trainable_words
+    words = ['word{}'.format(i) for i in range(NUM_WORDS)] + list(trainable_words)
+    word_index = {word: i for i, word in enumerate(words, start=1)}
+    word_matrix = np.random.normal(size=(len(word_index) + 1, params.embed_dim)).astype(np.float32)
+    trainable_matrix = np.random.normal(size=(len(trainable_words) + 1, params.embed_dim)).astype(np.float32)
+    char_matrix = np.random.normal(size=(NUM_CHARS + 1, params.char_dim)).astype(np.float32)
+
+    counts = {word: NUM_WORDS - i for i, word in enumerate(words[:NUM_WORDS])}
+    pruned_index = export_utils.prune_word_index(word_index, counts, NUM_WORDS // 4, trainable_words)
+    pruned_matrix = export_utils.prune_embedding_matrix(word_matrix, word_index, pruned_index)
+
+    feed_dict = {
+        'words': np.random.randint(1, len(pruned_index) + 1, size=(4, 6)),
+        'chars': np.random.randint(1, NUM_CHARS + 1, size=(4, 6, 5)),
+        'tags': np.zeros((4, 6, NUM_TAGS), dtype=np.float32),
+        'num_tokens': np.full((4, ), 6),
+    }
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Train a step on the full word matrix and save a checkpoint as train mode does.
+        with tf.Graph().as_default():
+            model, logits, inputs = build_model(params, word_matrix, char_matrix, trainable_matrix)
+            labels = tf.one_hot(tf.zeros_like(inputs['num_tokens']), NUM_CLASSES, dtype=tf.int32)
+            train_op = train_utils.construct_train_op(model.compute_loss(logits, labels, l2=params.l2),
+                                                      ema_decay=params.ema_decay)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer(), feed_dict=model.embedding.init_feed_dict)
+                sess.run(train_op, feed_dict={inputs[key]: value for key, value in feed_dict.items()})
+                saved_path = train_utils.get_saver().save(sess, os.path.join(model_dir, 'model.ckpt'))
+                averages = {var.op.name: value for var, value in
+                            zip(tf.global_variables(), sess.run(tf.global_variables()))}
+
+        # Build from the pruned matrix and restore as demo mode does.
+        with tf.Graph().as_default():
+            model, logits, inputs = build_model(params, pruned_matrix, char_matrix, trainable_matrix)
+
+            with tf.Session() as sess:
+                sess.run(tf.global_variables_initializer(), feed_dict=model.embedding.init_feed_dict)
+                saver = train_utils.get_saver(ema_decay=params.ema_decay, ema_vars_only=True,
+                                              exclude=model.embedding.word_embedding.weights)
+                saver.restore(sess, saved_path)
+                sess.run(logits, feed_dict={inputs[key]: value for key, value in feed_dict.items()})
+
+                word_embeddings = sess.run(model.embedding.word_embedding.weights[0])
+                assert np.array_equal(word_embeddings, pruned_matrix), 'Word embeddings were overwritten on restore.'
+
+                for layer in (model.embedding.trainable_embedding, model.embedding.char_embedding):
+                    variable = layer.weights[0]
+                    average = averages[ema_name(averages, variable.op.name)]
+                    assert np.allclose(sess.run(variable), average), '{} not restored.'.format(variable.op.name)
+
+    print('Restored a {} word checkpoint into a model built from a {} word export.'.format(len(word_index),
+                                                                                           len(pruned_index)))
+
+
+def ema_name(names, name):
+    """ Finds the name of the moving average of a variable, it's created under the ema_ops name scope. """
+    return next(key for key in names if key.endswith('{}/ExponentialMovingAverage'.format(name)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+""" Compares initializing the embedding matrices from constants embedded in the graph against feeding them through
+    placeholder initializers: graph build + initialization time, GraphDef size, event file size and peak RSS.
+
+    Each measurement runs in a fresh interpreter so peak RSS isn't shared. Reads the embedding .npy files saved by
+    preprocess for the defaults, or the files given as arguments.
+
+    Usage: python -m benchmarks.graph_benchmark [word_embeddings.npy trainable_embeddings.npy char_embeddings.npy]
+"""
+import json
+import subprocess
+import sys
+from src import constants, util
+
+MODES = ['constant', 'placeholder']
+
+BUILD_CODE = '''
+import json, os, resource, sys, tempfile, time
+import tensorflow as tf
+from src import layers, util
+
+mode, paths = sys.argv[1], sys.argv[2:]
+matrices = [util.dequantize_embeddings(matrix) for matrix in util.load_numpy_files(paths)]
+start = time.perf_counter()
+feed_dict = {}
+
+for i, matrix in enumerate(matrices):
+    if mode == 'constant':
+        initializer = tf.constant_initializer(matrix, verify_shape=True)
+    else:
+        initializer = layers.placeholder_initializer(matrix, feed_dict)
+    tf.get_variable('embedding_{}'.format(i), shape=matrix.shape, dtype=tf.float32, initializer=initializer)
+
+with tf.Session() as sess:
+    sess.run(tf.global_variables_initializer(), feed_dict=feed_dict)
+    build_time = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        writer = tf.summary.FileWriter(log_dir, graph=sess.graph)
+        writer.close()
+        event_size = sum(os.path.getsize(os.path.join(log_dir, name)) for name in os.listdir(log_dir))
+
+    print(json.dumps({
+        'build_time': build_time,
+        'graph_def_mb': sess.graph.as_graph_def().ByteSize() / (1024 * 1024),
+        'event_file_mb': event_size / (1024 * 1024),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+'''
+
+
+def measure(mode, paths):
+    """ Builds the embedding variables in a new interpreter and returns its measurements. """
+    output = subprocess.check_output([sys.executable, '-c', BUILD_CODE, mode] + paths)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1:
+        paths = sys.argv[1:]
+    else:
+        paths = util.embedding_paths(util.namespace_json(constants.FilePaths.DEFAULTS))
+
+    for mode in MODES:
+        result = measure(mode, paths)
+        print('{mode}: build + init {build_time:.2f}s, GraphDef {graph_def_mb:.1f} MB, '
+              'event file {event_file_mb:.1f} MB, peak RSS {peak_rss_mb:.0f} MB'.format(mode=mode, **result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+""" Compares the translate table based normalize() against the original per character loop.
+
+    Usage: python -m benchmarks.normalize_benchmark
+"""
+from benchmarks import timing
+from src import constants, util
+from src.preprocessing import text as prepro_text
+
+
+def loop_normalize(text):
+    """ The original normalize() implementation, classifies every character with unicodedata. """
+    text = text.strip()
+    out_text = []
+
+    for char in text:
+        if prepro_text.is_invalid(char):
+            continue
+
+        if prepro_text.is_whitespace(char):
+            out_text.append(' ')
+        elif prepro_text.is_dash(char):
+            out_text.append(' - ')
+        elif prepro_text.is_math_symbol(char):
+            out_text.append(' {} '.format(char))
+        else:
+            out_text.append(char)
+
+    return ''.join(out_text)
+
+
+def main():
+    tweets = util.concat_load_tsvs(constants.FilePaths.SEM_EVAL)['text'].tolist()
+
+    mismatches = [tweet for tweet in tweets if loop_normalize(tweet) != prepro_text.normalize(tweet)]
+    print('Checked {} tweets, {} mismatches.'.format(len(tweets), len(mismatches)))
+
+    before = timing.throughput(loop_normalize, tweets)
+    after = timing.throughput(prepro_text.normalize, tweets)
+    timing.report('normalize', before, after)
+
+
+if __name__ == '__main__':
+    main()
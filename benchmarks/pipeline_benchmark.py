@@ -0,0 +1,83 @@
+""" Compares an epoch of the train pipeline reading string records through the lookup tables against reading records
+    preindexed by IndexedRecordWriter: wall time and CPU time (user + sys of all threads) per epoch.
+
+    The first epoch includes parsing, the lookups + filling the cache, later epochs read the mapped rows from the cache.
+    Reads the train .tfrecord files saved by preprocess for the defaults, these must hold strings e.g.
+    preindex_records was off.
+
+    Usage: python -m benchmarks.pipeline_benchmark [num_epochs]
+"""
+import os
+import resource
+import sys
+import tempfile
+import time
+import tensorflow as tf
+from src import constants, pipeline, util
+from src import preprocessing as prepro
+
+
+def cpu_time():
+    """ Returns the user + sys CPU time used so far by every thread of this process. """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_epochs(params, vocabs, record_paths, meta, num_epochs, preindexed):
+    """ Builds the train pipeline in a new graph and returns the (wall, cpu) time of each epoch. """
+    num_batches = meta['num_train'] // params.batch_size
+    times = []
+
+    with tf.Graph().as_default():
+        with tf.device('/cpu:0'):
+            tables = None if preindexed else pipeline.create_lookup_tables(vocabs)
+            _, iterator = pipeline.create_pipeline(params, tables, record_paths, meta['num_classes'],
+                                                   meta['num_tags'], training=True, preindexed=preindexed)
+            next_batch = iterator.get_next()
+
+        with tf.Session() as sess:
+            sess.run([tf.tables_initializer(), iterator.initializer])
+
+            for _ in range(num_epochs):
+                start, start_cpu = time.perf_counter(), cpu_time()
+                for _ in range(num_batches):
+                    sess.run(next_batch)
+                times.append((time.perf_counter() - start, cpu_time() - start_cpu, ))
+
+    return times
+
+
+def main():
+    num_epochs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    params = util.namespace_json(constants.FilePaths.DEFAULTS)
+    meta = util.load_json(util.meta_path(params))
+
+    if meta.get('preindexed', False):
+        raise ValueError('The train records are already preindexed, preprocess with preindex_records off.')
+
+    word_index_path, _, char_index_path, pos_index_path = util.index_paths(params)
+    word_vocab_path, _, char_vocab_path, pos_vocab_path = util.vocab_paths(params)
+    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path),
+                                   array_paths=(word_vocab_path, char_vocab_path, pos_vocab_path))
+    train_paths, _ = util.tf_record_paths(params)
+    train_paths = [train_paths] if isinstance(train_paths, str) else train_paths
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer = prepro.IndexedRecordWriter(params.max_tokens, vocabs)
+        indexed_paths = [os.path.join(tmp_dir, os.path.basename(path)) for path in train_paths]
+        start = time.perf_counter()
+        for path, indexed_path in zip(train_paths, indexed_paths):
+            writer.convert(path, indexed_path)
+        print('Indexed {} train rows in {:.1f}s, {:.1f} MB -> {:.1f} MB'.format(
+            meta['num_train'], time.perf_counter() - start,
+            sum(os.path.getsize(path) for path in train_paths) / (1024 * 1024),
+            sum(os.path.getsize(path) for path in indexed_paths) / (1024 * 1024)))
+
+        for name, paths, preindexed in [('strings', train_paths, False), ('preindexed', indexed_paths, True)]:
+            for epoch, (wall, cpu) in enumerate(run_epochs(params, vocabs, paths, meta, num_epochs, preindexed)):
+                print('{name} epoch {epoch}: {wall:.2f}s wall, {cpu:.2f}s CPU'.format(
+                    name=name, epoch=epoch + 1, wall=wall, cpu=cpu))
+
+
+if __name__ == '__main__':
+    main()
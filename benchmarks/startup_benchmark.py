@@ -0,0 +1,57 @@
+""" Reports the startup time saved per mode by importing modes and loading resources on demand.
+
+    Each measurement runs in a fresh interpreter. The eager figure imports every mode module and loads the
+    segmentation tables, as main.py did before, the lazy figure imports main plus the selected mode only. Both include
+    the resources the mode actually needs once it starts running.
+
+    Usage: python -m benchmarks.startup_benchmark
+"""
+import subprocess
+import sys
+import time
+from src import constants
+
+MODE_MODULES = {
+    constants.Modes.TRAIN: 'train',
+    constants.Modes.TEST: 'test',
+    constants.Modes.PREPROCESS: 'preprocess',
+    constants.Modes.DEMO: 'demo',
+}
+
+MODE_RESOURCES = {
+    constants.Modes.TRAIN: [],
+    constants.Modes.TEST: [],
+    constants.Modes.PREPROCESS: [constants.Resources.WORD_SEGMENT, constants.Resources.SPACY_EN],
+    constants.Modes.DEMO: [constants.Resources.WORD_SEGMENT, constants.Resources.SPACY_EN],
+}
+
+
+def time_snippet(code, repeats=3):
+    """ Returns the fastest wall time of running code in a new interpreter. """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code])
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def load_resources_code(names):
+    return ''.join(['resources.get({!r});'.format(name) for name in names])
+
+
+def main():
+    eager_imports = 'import main, train, test, preprocess, demo; from src import resources;'
+
+    for mode, module in MODE_MODULES.items():
+        # The segmentation tables used to be loaded at import time regardless of mode.
+        eager_resources = set(MODE_RESOURCES[mode]) | {constants.Resources.WORD_SEGMENT}
+        eager = time_snippet(eager_imports + load_resources_code(eager_resources))
+        lazy = time_snippet('import main, {}; from src import resources;'.format(module) +
+                            load_resources_code(MODE_RESOURCES[mode]))
+        print('{mode}: eager {eager:.2f}s, lazy {lazy:.2f}s, saved {saved:.2f}s'.format(
+            mode=mode, eager=eager, lazy=lazy, saved=eager - lazy))
+
+
+if __name__ == '__main__':
+    main()
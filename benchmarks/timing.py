@@ -0,0 +1,25 @@
+import time
+
+
+def throughput(fn, items, repeats=3):
+    """ Times fn over every item and returns the best items/sec over a number of repeats.
+        Args:
+            fn: Function to call on each item.
+            items: List of inputs.
+            repeats: Number of timed runs, the fastest is reported to reduce noise.
+        Returns:
+            Items processed per second.
+    """
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def report(name, before, after, unit='tweets/sec'):
+    """ Prints a before/after comparison. """
+    print('{name}: before {before:,.0f} {unit}, after {after:,.0f} {unit} ({speedup:.2f}x)'.format(
+        name=name, before=before, after=after, unit=unit, speedup=after / before))
@@ -0,0 +1,49 @@
+""" Checks the rules tokenizer backend produces the same tokens as the spaCy backend and compares throughput.
+
+    Both tokenizers are given the embedding vocab as in preprocessing, so out of vocab tokens are error corrected and
+    the corrected tokens are compared as well as the original tokens.
+
+    Usage: python -m benchmarks.tokenizer_parity
+"""
+from benchmarks import timing
+from src import constants, util, tokenizer as toke
+from src import preprocessing as prepro
+
+NUM_SHOWN = 10
+
+
+def main():
+    params = util.namespace_json(constants.FilePaths.DEFAULTS)
+    tweets = util.concat_load_tsvs(constants.FilePaths.SEM_EVAL)['text'].tolist()
+    tweets = [prepro.clean(tweet) for tweet in tweets]
+    vocab = util.read_embeddings_vocab(params.embeddings_path, use_cache=params.cache_embeddings)
+
+    tokenizers = [toke.Tokenizer(vocab=vocab, oov_token=params.oov_token, trainable_words=params.trainable_words,
+                                 filters=None, backend=backend)
+                  for backend in (constants.TokenizerBackends.SPACY, constants.TokenizerBackends.RULES)]
+    spacy_tokenizer, rules_tokenizer = tokenizers
+
+    token_mismatches, corrected_mismatches = 0, []
+    for tweet in tweets:
+        spacy_tokens, spacy_modified, _ = spacy_tokenizer.tokenize(tweet)
+        rules_tokens, rules_modified, rules_tags = rules_tokenizer.tokenize(tweet)
+
+        if spacy_tokens != rules_tokens:
+            token_mismatches += 1
+        elif spacy_modified != rules_modified:
+            corrected_mismatches += [(spacy, rules) for spacy, rules in zip(spacy_modified, rules_modified)
+                                     if spacy != rules]
+        assert all(tag == constants.TokenizerBackends.NO_TAG for tag in rules_tags)
+
+    print('Checked {} tweets, {} token mismatches, {} corrected token mismatches.'.format(
+        len(tweets), token_mismatches, len(corrected_mismatches)))
+    for spacy, rules in corrected_mismatches[:NUM_SHOWN]:
+        print('  spacy: {} rules: {}'.format(spacy, rules))
+
+    before = timing.throughput(spacy_tokenizer.tokenize, tweets, repeats=1)
+    after = timing.throughput(rules_tokenizer.tokenize, tweets, repeats=1)
+    timing.report('tokenize', before, after)
+
+
+if __name__ == '__main__':
+    main()
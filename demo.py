@@ -2,7 +2,8 @@ import os
 import random
 import numpy as np
 import tensorflow as tf
-from src import config, constants, demo_utils, models, pipeline, train_utils, util, tokenizer as toke, preprocessing as prepro
+from src import config, constants, demo_utils, export_utils, models, pipeline, train_utils, util, tokenizer as toke, \
+    preprocessing as prepro
 
 API_VERSION = 1
 BAD_REQUEST_CODE = 400
@@ -32,6 +33,17 @@ def demo(sess_config, params):
     embedding_paths = util.embedding_paths(params)
     meta_path = util.meta_path(params)
     classes_path = util.classes_path(params)
+    prepro.segmentation_cache.resize(params.segmentation_cache_size)
+    prepro.segmentation_cache.load(util.segmentation_cache_path(params))
+
+    word_vocab_path, _, char_vocab_path, pos_vocab_path = util.vocab_paths(params)
+
+    # Serve the word index + embeddings pruned to the most used words if they've been exported, see export.py.
+    export_index_path, export_vocab_path, export_embeddings_path, export_report_path = util.export_paths(params)
+    if export_utils.export_is_current(export_report_path, word_index_path):
+        print('Using the word index + embeddings exported to {}'.format(util.export_directory(params)))
+        word_index_path, word_vocab_path, embedding_paths[0] = export_index_path, export_vocab_path, \
+            export_embeddings_path
 
     json_paths = (word_index_path, char_index_path, examples_path, meta_path, classes_path, )
     word_index, char_index, examples, meta, classes = util.load_multiple_jsons(paths=json_paths)
@@ -42,9 +54,11 @@ def demo(sess_config, params):
                                word_index=word_index,
                                char_index=char_index,
                                trainable_words=params.trainable_words,
-                               filters=None)
+                               filters=None,
+                               backend=meta.get('tokenizer_backend', util.get_tokenizer_backend(params)))
 
-    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path))
+    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path),
+                                   array_paths=(word_vocab_path, char_vocab_path, pos_vocab_path))
     word_matrix, trainable_matrix, character_matrix = util.load_numpy_files(paths=embedding_paths)
     tables = pipeline.create_lookup_tables(vocabs)
     # Keep sess alive as long as the server is live, probably not best practice but it works @TODO Improve this.
@@ -71,9 +85,11 @@ def demo(sess_config, params):
         raise ValueError(constants.ErrorMessages.DEMO_UNSUPPORTED_MODEL.format(model_type=params.model_type))
 
     demo_outputs = [logits, prediction, attn_weights]
-    sess.run(tf.global_variables_initializer())
+    sess.run(tf.global_variables_initializer(), feed_dict=model.embedding.init_feed_dict)
 
-    saver = train_utils.get_saver(ema_decay=params.ema_decay, ema_vars_only=True)
+    # The frozen word embeddings come from the embeddings file, it may be a pruned export of a different shape.
+    saver = train_utils.get_saver(ema_decay=params.ema_decay, ema_vars_only=True,
+                                  exclude=model.embedding.word_embedding.weights)
     saver.restore(sess, tf.train.latest_checkpoint(model_dir))
 
     @app.route('/api/v{0}/model/predict'.format(API_VERSION), methods=['POST'])
@@ -0,0 +1,92 @@
+import os
+import time
+from collections import Counter
+import numpy as np
+from src import config, constants, export_utils, util, tokenizer as toke
+from src import preprocessing as prepro
+
+
+def load_profile(params, word_index):
+    """ Counts how often each word is used, either in a file of logged requests or in the saved training corpus. """
+    if params.export_profile:
+        meta = util.load_json(util.meta_path(params))
+        tokenizer = toke.Tokenizer(lower=False,
+                                   oov_token=params.oov_token,
+                                   word_index=word_index,
+                                   trainable_words=params.trainable_words,
+                                   filters=None,
+                                   backend=meta.get('tokenizer_backend', util.get_tokenizer_backend(params)))
+        counts = Counter()
+        with open(params.export_profile, 'r', encoding='utf-8') as f:
+            for line in f:
+                if len(line.strip()) > 0:
+                    # Count the tokens demo mode looks up in the word index.
+                    _, modified_tokens, _ = tokenizer.tokenize(prepro.clean(line.strip()))
+                    counts.update(modified_tokens)
+        return counts
+
+    corpus_path = util.corpus_directory(params)
+    if not util.file_exists(os.path.join(corpus_path, constants.FileNames.CORPUS_META)):
+        raise ValueError(constants.ErrorMessages.NO_CORPUS.format(path=corpus_path))
+    word_counter, _, _ = prepro.CorpusStore.load(corpus_path).counters()
+    return word_counter
+
+
+def load_time(index_path, vocab_path, embeddings_path):
+    """ Times loading a word index, vocab array and embedding matrix as demo mode does on startup. """
+    start = time.perf_counter()
+    util.load_json(index_path)
+    if util.file_exists(vocab_path):
+        np.load(vocab_path)
+    np.load(embeddings_path)
+    return time.perf_counter() - start
+
+
+def export(params):
+    """ Exports a word index + embedding matrix pruned to the words most used in the frequency profile for serving.
+
+        Only the word index, vocab + embeddings change, the trainable and char embeddings are restored from the
+        checkpoint as before. A report of the coverage lost against the memory + load time saved is saved alongside,
+        demo mode serves the export for as long as the word index it was made from is unchanged.
+    """
+    word_index_path = util.index_paths(params)[0]
+    word_vocab_path = util.vocab_paths(params)[0]
+    word_embeddings_path = util.embedding_paths(params)[0]
+    export_index_path, export_vocab_path, export_embeddings_path, report_path = util.export_paths(params)
+
+    word_index = util.load_json(word_index_path)
+    counts = load_profile(params, word_index)
+    reserved_words = list(params.trainable_words) + [params.oov_token]
+    pruned_index = export_utils.prune_word_index(word_index, counts, params.export_words, reserved_words)
+
+    matrix = np.load(word_embeddings_path)
+    pruned_matrix = export_utils.prune_embedding_matrix(matrix, word_index, pruned_index)
+
+    util.make_dirs(util.export_directory(params))
+    util.save_json(export_index_path, pruned_index)
+    np.save(export_vocab_path, util.index_to_array(pruned_index))
+    np.save(export_embeddings_path, pruned_matrix)
+
+    report = {
+        'profile': params.export_profile if params.export_profile else util.corpus_directory(params),
+        'word_index_hash': export_utils.file_hash(word_index_path),
+        'num_words': len(word_index),
+        'num_export_words': len(pruned_index),
+        'coverage': export_utils.coverage(counts, word_index),
+        'export_coverage': export_utils.coverage(counts, pruned_index),
+        'memory_mb': matrix.nbytes / (1024 * 1024),
+        'export_memory_mb': pruned_matrix.nbytes / (1024 * 1024),
+        'load_time': load_time(word_index_path, word_vocab_path, word_embeddings_path),
+        'export_load_time': load_time(export_index_path, export_vocab_path, export_embeddings_path),
+    }
+    util.save_json(report_path, report, indent=2)
+
+    print('Exported {} of {} words to {}'.format(len(pruned_index), len(word_index), util.export_directory(params)))
+    print('Token coverage: {:.4f} -> {:.4f}, memory: {:.1f} MB -> {:.1f} MB, load time: {:.3f}s -> {:.3f}s'.format(
+        report['coverage']['token_coverage'], report['export_coverage']['token_coverage'], report['memory_mb'],
+        report['export_memory_mb'], report['load_time'], report['export_load_time']))
+
+
+if __name__ == '__main__':
+    defaults = util.namespace_json(path=constants.FilePaths.DEFAULTS)
+    export(config.model_config(defaults).FLAGS)
@@ -1,8 +1,4 @@
 from src import constants, config, util
-from train import train
-from test import test
-from preprocess import preprocess
-from demo import demo
 
 
 def main(sess_config, params):
@@ -16,15 +12,24 @@ def main(sess_config, params):
     if mode in {constants.Modes.TRAIN, constants.Modes.TEST, constants.Modes.DEMO, constants.Modes.DEBUG}:
         params = util.load_config(params, util.config_path(params))  # Loads a pre-existing config otherwise == params
 
+    # Modes are imported on demand so each mode only pays the import cost of the modules it uses.
     if mode == constants.Modes.TRAIN:
+        from train import train
         train(sess_config, params)
     elif mode == constants.Modes.DEBUG:
+        from train import train
         train(sess_config, params, debug=True)
     elif mode == constants.Modes.TEST:
+        from test import test
         test(sess_config, params)
     elif mode == constants.Modes.PREPROCESS:
+        from preprocess import preprocess
         preprocess(params)
+    elif mode == constants.Modes.EXPORT:
+        from export import export
+        export(params)
     elif mode == constants.Modes.DEMO:
+        from demo import demo
         app = demo(sess_config, params)
         app.run(port=params.demo_server_port)
     else:
@@ -1,4 +1,4 @@
-from src import config, constants, util
+from src import config, constants, profiling, util
 from src import preprocessing as prepro
 
 
@@ -8,22 +8,52 @@ def preprocess(params):
 
     output_dir = util.processed_data_directory(params)
 
-    # Prompt user for confirmation if this action overwrites existing data.
-    if util.directory_exists(output_dir) and not util.directory_is_empty(output_dir):
+    stream = dataset == constants.Datasets.SENT_140 and params.stream_preprocessing
+    incremental = params.incremental_preprocessing
+    if incremental and not params.from_tokens and (stream or params.sharded_preprocessing):
+        print('Warning: incremental_preprocessing is not supported with stream or sharded preprocessing, '
+              'every row will be tokenized and the token cache is left unchanged.')
+        incremental = False
+
+    # Prompt user for confirmation if this action overwrites existing data, incremental runs reuse it instead.
+    if util.directory_exists(output_dir) and not util.directory_is_empty(output_dir) \
+            and not (incremental or params.from_tokens):
         if not util.yes_no_prompt(constants.Prompts.DATA_EXISTS):
             exit(0)
 
-    if dataset == constants.Datasets.SEM_EVAL:
-        data = prepro.get_data_sem_eval(constants.FilePaths.SEM_EVAL)
-        prepro.process(params, data)
-    elif dataset == constants.Datasets.SEM_EVAL_2017:
-        data = prepro.get_data_sem_eval(constants.FilePaths.SEM_EVAL_2017)
-        prepro.process(params, data)
-    elif dataset == constants.Datasets.SENT_140:
-        data = prepro.get_data_sent_140(constants.FilePaths.SENT_140, max_examples=params.max_examples)
-        prepro.process(params, data)
+    cprofile_dir = output_dir if params.cprofile_preprocessing else None
+    profiling.profiler.reset(enabled=params.profile_preprocessing, cprofile_dir=cprofile_dir)
+
+    if params.from_tokens:
+        prepro.process_from_tokens(params)
+    elif stream:
+        def read_chunks():
+            return prepro.iter_data_sent_140(constants.FilePaths.SENT_140, chunk_size=params.stream_chunk_size,
+                                             max_examples=params.max_examples)
+        prepro.process_stream(params, read_chunks(), fit_chunks=read_chunks())
     else:
-        raise NotImplementedError('Unsupported dataset: Valid datasets are {}.'.format('squad'))
+        with profiling.stage('load_data'):
+            if dataset == constants.Datasets.SEM_EVAL:
+                data = prepro.get_data_sem_eval(constants.FilePaths.SEM_EVAL, util.tsv_cache_directory(params))
+            elif dataset == constants.Datasets.SEM_EVAL_2017:
+                data = prepro.get_data_sem_eval(constants.FilePaths.SEM_EVAL_2017,
+                                                util.tsv_cache_directory(params))
+            elif dataset == constants.Datasets.SENT_140:
+                data = prepro.get_data_sent_140(constants.FilePaths.SENT_140, max_examples=params.max_examples)
+            else:
+                raise NotImplementedError('Unsupported dataset: Valid datasets are {}.'.format('squad'))
+
+        if params.sharded_preprocessing:
+            prepro.process_sharded(params, data)
+        else:
+            prepro.process(params, data)
+
+    if params.preindex_records:
+        prepro.index_records(params)
+
+    if params.profile_preprocessing:
+        profiling.profiler.save(util.profile_path(params))
+        print('Saved preprocessing profile to {}'.format(util.profile_path(params)))
 
 
 if __name__ == '__main__':
@@ -25,6 +25,10 @@ def model_config(defaults):
     flags.DEFINE_string('run_name', defaults.run_name, 'Name for this run of training.')
     # Within these flags we define where to find the original GLoVe/FastText embeddings and where to find/save data.
     flags.DEFINE_string('embeddings_path', defaults.embeddings_path, 'Path to Glove/embedding file.')
+    flags.DEFINE_boolean('cache_embeddings', defaults.cache_embeddings,
+                         'Convert the embeddings file to a memory mapped binary cache once and read that instead.')
+    flags.DEFINE_string('embedding_dtype', defaults.embedding_dtype,
+                        'Dtype to save the word embedding matrix as, options are float32, float16, int8.')
     flags.DEFINE_string('data_dir', defaults.data_dir,
                         'Directory to save pre-processed word/char embeddings, indexes and data.')
     flags.DEFINE_string('raw_data_dir', defaults.data_dir,
@@ -48,6 +52,47 @@ def model_config(defaults):
                          'Min times a word must be seen to be included in the word index.')
     flags.DEFINE_integer('min_char_occur', defaults.min_chars,
                          'Min times a character must be seen to be included in the char index.')
+    flags.DEFINE_integer('segmentation_cache_size', defaults.segmentation_cache_size,
+                         'Max number of hashtag segmentations to cache.')
+    flags.DEFINE_string('tokenizer_backend', defaults.tokenizer_backend,
+                        'Tokenizer backend, options are auto, spacy, rules. Auto only tags when use_pos_tags is set, '
+                        'rules corrects tokens with lookup rather than POS based lemmas so tokens may differ.')
+    flags.DEFINE_integer('correction_cache_size', defaults.correction_cache_size,
+                         'Max number of token error corrections to cache.')
+    flags.DEFINE_integer('tokenizer_batch_size', defaults.tokenizer_batch_size,
+                         'Number of texts spaCy tokenizes per batch.')
+    flags.DEFINE_integer('max_examples', defaults.max_examples, 'Max number of Sentiment140 rows to use, -1 for all.')
+    flags.DEFINE_boolean('stream_preprocessing', defaults.stream_preprocessing,
+                         'Read, tokenize and write Sentiment140 in chunks to keep memory flat.')
+    flags.DEFINE_integer('stream_chunk_size', defaults.stream_chunk_size, 'Rows per chunk when streaming.')
+    flags.DEFINE_boolean('sharded_preprocessing', defaults.sharded_preprocessing,
+                         'Clean, tokenize and write one .tfrecord shard per preprocess worker.')
+    flags.DEFINE_boolean('incremental_preprocessing', defaults.incremental_preprocessing,
+                         'Reuse tokenized rows from previous runs and checkpoint new ones so runs can resume, '
+                         'not used with stream or sharded preprocessing.')
+    flags.DEFINE_integer('checkpoint_chunk_size', defaults.checkpoint_chunk_size,
+                         'Rows per checkpointed chunk when preprocessing incrementally.')
+    flags.DEFINE_float('val_split', defaults.val_split, 'Fraction of rows assigned to the val set by hashing text.',
+                       lower_bound=0.0, upper_bound=1.0)
+    flags.DEFINE_boolean('stratify_split', defaults.stratify_split,
+                         'Keep the fraction of val rows within one row of val_split for every class.')
+    flags.DEFINE_boolean('profile_preprocessing', defaults.profile_preprocessing,
+                         'Record time + memory per preprocessing stage to profile.json.')
+    flags.DEFINE_boolean('cprofile_preprocessing', defaults.cprofile_preprocessing,
+                         'Also dump cProfile stats per preprocessing stage, requires profile_preprocessing.')
+    flags.DEFINE_boolean('save_corpus', defaults.save_corpus,
+                         'Save the tokenized corpus so from_tokens can skip re-tokenizing.')
+    flags.DEFINE_boolean('from_tokens', defaults.from_tokens,
+                         'Rebuild indexes, embeddings and records from the saved tokenized corpus.')
+    flags.DEFINE_boolean('preindex_records', defaults.preindex_records,
+                         'Store word, char and tag ids in the .tfrecord files so training skips the lookup tables.')
+    # Export a pruned word index + embeddings for serving.
+    flags.DEFINE_integer('export_words', defaults.export_words,
+                         'Max number of words (excluding trainable words) to keep in the serving export.')
+    flags.DEFINE_string('export_profile', defaults.export_profile,
+                        'Text file of logged requests, one per line, to rank words by. Empty uses the training corpus.')
+    flags.DEFINE_integer('preprocess_workers', defaults.preprocess_workers,
+                         'Number of worker processes used for preprocessing, -1 to use the CPU count.')
     # QANet paper utilises a trainable OOV token, we also allow specification of multiple trainable word embeddings.
     flags.DEFINE_string('oov_token', defaults.oov_token, 'Which word represents out of vocab words.')
     flags.DEFINE_list('trainable_words', defaults.trainable_words, 'Which words should have trainable embeddings.')
@@ -56,6 +101,10 @@ def model_config(defaults):
                          'Buffer size of the dataset shuffle function.')
     flags.DEFINE_integer('tf_record_buffer_size', defaults.tf_record_buffer_size,
                          'Buffer size of a tf_record dataset.')
+    flags.DEFINE_string('pipeline_cache', defaults.pipeline_cache,
+                        'Where to cache the mapped train/val rows, one of auto, memory or file.')
+    flags.DEFINE_integer('cache_memory_mb', defaults.cache_memory_mb,
+                         'Max estimated size of the train + val rows to cache in memory when pipeline_cache is auto.')
     flags.DEFINE_boolean('bucket', defaults.bucket, 'Whether to use bucketing (used in paper).')
     flags.DEFINE_list('bucket_ranges', defaults.bucket_ranges, 'Ranges for bucketing (if enabled).')
     flags.DEFINE_integer('bucket_size', defaults.bucket_size, 'Size of a bucket (If no bucket ranges given).')
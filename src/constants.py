@@ -36,12 +36,25 @@ class FileNames:
         * EXAMPLES: Filename to store examples of data.
         * INDEX: Filename + type for word/character index files.
         * EMBEDDINGS: Filename + type for word/character embedding files.
+        * VOCAB: Filename + type for dense arrays of the words in an index ordered by id.
         * CONTEXT: Filename + type for storing context related information for eval/test files.
         * ANSWERS: Filename + type for storing answer related information for eval/test files.
         * TF_RECORD: Tfrecord template string for storing processed train/dev files.
+        * TF_RECORD_SHARD: Tfrecord template string for one shard of a processed train/dev file.
+        * RECORDS_MANIFEST: Name of the .json file listing the .tfrecord shards for train/val.
         * TRAIN: String representing train mode data.
         * DEV: String representing val mode data.
         * CONFIG: Name of a model config file.
+        * SEGMENTATION_CACHE: Name of the saved hashtag segmentation cache.
+        * EXPORT_REPORT: Name of the .json file reporting the coverage, memory and load time of a serving export.
+        * EMBEDDING_CACHE: Template for the directory holding the binary cache of an embeddings text file.
+        * EMBEDDING_VECTORS: Name of the .npy matrix of vectors within an embeddings cache.
+        * CORPUS_META: Name of the .json file describing a saved tokenized corpus.
+        * TSV_CACHE: Filename template for a cached copy of a set of .tsv files.
+        * PROFILE: Name of the .json file storing per stage preprocessing timings.
+        * CPROFILE: Filename template for the cProfile stats of a preprocessing stage.
+        * TOKEN_CACHE_MANIFEST: Name of the .json file listing the checkpointed chunks of tokenized rows.
+        * TOKEN_CACHE_CHUNK: Filename template for one checkpointed chunk of tokenized rows.
     """
     EXAMPLES = 'examples.json'
     META = 'meta.json'
@@ -49,9 +62,22 @@ class FileNames:
     CONFIG = 'model_config.json'
     INDEX = '{embedding_type}_index.json'
     EMBEDDINGS = '{embedding_type}_embeddings.npy'
+    VOCAB = '{embedding_type}_vocab.npy'
     TF_RECORD = '{name}.tfrecord'
+    TF_RECORD_SHARD = '{name}-{shard:05d}-of-{num_shards:05d}.tfrecord'
+    RECORDS_MANIFEST = 'records.json'
     TRAIN = 'train'
     VAL = 'val'
+    SEGMENTATION_CACHE = 'segmentation_cache.json'
+    TOKEN_CACHE_MANIFEST = 'manifest.json'
+    PROFILE = 'profile.json'
+    TSV_CACHE = 'tsv-{key}.npz'
+    CORPUS_META = 'corpus.json'
+    EMBEDDING_CACHE = '{path}.cache'
+    EXPORT_REPORT = 'export.json'
+    EMBEDDING_VECTORS = 'vectors.npy'
+    CPROFILE = 'profile-{stage}.prof'
+    TOKEN_CACHE_CHUNK = 'chunk-{chunk:05d}.json'
 
 
 class DirNames:
@@ -62,6 +88,11 @@ class DirNames:
         * RECORDS: Name of the directory to store .tfrecord files.
         * PROCESSED: Name of the directory to store processed data.
         * EMBEDDINGS: Name of the directory to store raw embeddings.
+        * CACHE: Name of the directory within the processed data to store cached copies of raw data.
+        * CORPUS: Name of the directory to store the tokenized corpus.
+        * EXPORT: Name of the directory to store the pruned word index + embeddings exported for serving.
+        * TOKEN_CACHE: Name of the directory to store tokenized rows for incremental preprocessing.
+        * PIPELINE_CACHE: Name of the directory within a run to store file caches of the mapped train/val rows.
         * SQUAD_1: Name of the squad v1 directory.
         * SQUAD_2: Name of the squad v2 directory.
     """
@@ -70,6 +101,11 @@ class DirNames:
     RECORDS = 'records'
     PROCESSED = 'processed'
     EMBEDDINGS = 'embeddings'
+    CACHE = 'cache'
+    CORPUS = 'corpus'
+    EXPORT = 'export'
+    TOKEN_CACHE = 'token_cache'
+    PIPELINE_CACHE = 'pipeline_cache'
     SQUAD_1 = Datasets.SEM_EVAL
     SQUAD_2 = Datasets.SENT_140
 
@@ -83,9 +119,11 @@ class Modes:
         * DEBUG: Debug mode.
         * DEMO: inference mode.
         * DOWNLOAD: download mode.
+        * EXPORT: Export a pruned word index + embeddings for serving.
     """
     DEBUG = 'debug'
     DEMO = 'demo'
+    EXPORT = 'export'
     PREPROCESS = 'preprocess'
     TEST = 'test'
     TRAIN = 'train'
@@ -109,6 +147,54 @@ class EmbeddingTypes:
         return [EmbeddingTypes.WORD, EmbeddingTypes.TRAINABLE, EmbeddingTypes.CHAR, EmbeddingTypes.POS]
 
 
+class Resources:
+    """ Names of lazily loaded resources held by src.resources.
+        The following keys are defined:
+        * WORD_SEGMENT: wordsegment module with its unigram/bigram tables loaded.
+        * SPACY_EN: spaCy en_core_web_sm pipeline without the parser.
+        * SPACY_EN_TOKENIZER: Blank english spaCy pipeline, only tokenizes.
+    """
+    WORD_SEGMENT = 'word_segment'
+    SPACY_EN = 'spacy_en_core_web_sm'
+    SPACY_EN_TOKENIZER = 'spacy_en_tokenizer'
+
+
+class TokenizerBackends:
+    """ Possible values of the tokenizer_backend parameter.
+        AUTO: Use rules unless POS tags are used as a feature.
+        SPACY: Tokenize and tag with the full en_core_web_sm pipeline.
+        RULES: Only run the rule based tokenizer, every token gets the NO_TAG tag. Lemmas used to correct out of vocab
+               tokens come from a lookup table rather than the POS tags, so corrected tokens can differ from SPACY.
+        NO_TAG: Tag given to every token by the rules backend.
+    """
+    AUTO = 'auto'
+    SPACY = 'spacy'
+    RULES = 'rules'
+    NO_TAG = 'XX'
+
+
+class EmbeddingDtypes:
+    """ Possible values of the embedding_dtype parameter.
+        FLOAT32: Save the word embedding matrix as 32 bit floats.
+        FLOAT16: Save the word embedding matrix as 16 bit floats, half the memory + disk space of float32.
+        INT8: Save the word embedding matrix as 8 bit ints with a float32 scale per row, a quarter of float32.
+    """
+    FLOAT32 = 'float32'
+    FLOAT16 = 'float16'
+    INT8 = 'int8'
+
+
+class PipelineCaches:
+    """ Possible values of the pipeline_cache parameter.
+        AUTO: Cache in memory if the estimated size of the train + val rows fits in cache_memory_mb, otherwise file.
+        MEMORY: Cache the mapped rows in memory.
+        FILE: Cache the mapped rows in files within the run directory.
+    """
+    AUTO = 'auto'
+    MEMORY = 'memory'
+    FILE = 'file'
+
+
 class ErrorMessages:
     """ Constant error messages.
         The following keys are defined:
@@ -126,6 +212,11 @@ class ErrorMessages:
     INVALID_RNN_TYPE = 'RNN type invalid, expected one of LSTM, GRU. Got {rnn_type}.'
     INVALID_MODEL_TYPE = 'Model type invalid, expected one of attention, conc_pool, pool. Got {model_type}'
     DEMO_UNSUPPORTED_MODEL = 'Demo mode only supports attention model. Got {model_type}'
+    UNKNOWN_RESOURCE = 'No loader registered for resource {name}.'
+    INVALID_TOKENIZER_BACKEND = 'Tokenizer backend invalid, expected one of auto, spacy, rules. Got {backend}'
+    NO_CORPUS = 'No tokenized corpus found at {path}, run preprocess with save_corpus first.'
+    INVALID_EMBEDDING_DTYPE = 'Embedding dtype invalid, expected one of float32, float16, int8. Got {dtype}'
+    INVALID_PIPELINE_CACHE = 'Pipeline cache invalid, expected one of auto, memory, file. Got {cache}'
 
 
 class Prompts:
@@ -0,0 +1,66 @@
+import hashlib
+import numpy as np
+from src import util
+
+
+def prune_word_index(word_index, counts, num_words, reserved_words):
+    """ Creates a word index of only the num_words most frequent words of word_index.
+
+        Words are ranked by their count in the frequency profile, words that are never seen are dropped even if fewer
+        than num_words are kept. Kept words keep their relative order and are renumbered from 1, reserved words
+        (trainable words + the OOV token) are always kept and stay at the end of the index in their original order
+        so the trainable embedding ids line up with the trained trainable matrix. Dropped words are looked up as an
+        unknown word, e.g. they get the same id as any other word missing from the index.
+
+        Args:
+            word_index: A dict of word: index mappings.
+            counts: A dict or Counter of word: frequency in the profile.
+            num_words: Max number of words to keep, excluding reserved words.
+            reserved_words: List of words that are always kept.
+        Returns:
+            A dict of word: index mappings.
+    """
+    reserved_words = set(reserved_words)
+    ranked = sorted([word for word in word_index if word not in reserved_words and counts.get(word, 0) > 0],
+                    key=lambda word: (-counts[word], word_index[word]))
+    kept = sorted(ranked[:num_words], key=word_index.get)
+    kept += sorted([word for word in word_index if word in reserved_words], key=word_index.get)
+    return {word: i for i, word in enumerate(kept, start=1)}
+
+
+def prune_embedding_matrix(matrix, word_index, pruned_index):
+    """ Gathers the rows of the words in pruned_index from an embedding matrix, keeping row 0 for padding.
+        Args:
+            matrix: An embedding matrix of shape [len(word_index) + 1, ...], may be quantized.
+            word_index: A dict of word: index mappings for the rows of matrix.
+            pruned_index: A dict of word: index mappings of a subset of word_index.
+        Returns:
+            An embedding matrix of shape [len(pruned_index) + 1, ...].
+    """
+    rows = np.zeros(len(pruned_index) + 1, dtype=np.int64)
+    for word, index in pruned_index.items():
+        rows[index] = word_index[word]
+    return matrix[rows]
+
+
+def coverage(counts, word_index):
+    """ Returns the fraction of word occurrences + distinct words in the frequency profile found in word_index. """
+    total = sum(counts.values())
+    found = sum(count for word, count in counts.items() if word in word_index)
+    return {
+        'token_coverage': found / total if total > 0 else 0.0,
+        'type_coverage': sum(1 for word in counts if word in word_index) / len(counts) if len(counts) > 0 else 0.0,
+    }
+
+
+def file_hash(path):
+    """ Returns a hex digest of the contents of a file. """
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def export_is_current(report_path, word_index_path):
+    """ Tests whether a serving export exists and was made from the current word index. """
+    if not util.file_exists(report_path) or not util.file_exists(word_index_path):
+        return False
+    return util.load_json(report_path).get('word_index_hash') == file_hash(word_index_path)
@@ -1,7 +1,8 @@
 from .attention import Attention
 from .highway_layer import HighwayLayer
+from .compressed_embedding import CompressedEmbedding, is_compressed
 from .embedding_layer import EmbeddingLayer
 from .top_k_pooling import TopKPooling
 from .hidden_block import HiddenStack, HiddenBlock
 from .rnn_block import RNNStack, RNNBlock
-from .utils import apply_mask, create_mask
+from .utils import apply_mask, create_mask, placeholder_initializer
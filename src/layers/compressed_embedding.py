@@ -0,0 +1,75 @@
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras.layers import Layer
+from src import util
+from src.layers.utils import placeholder_initializer
+
+
+def is_compressed(matrix):
+    """ Tests whether an embedding matrix is stored as float16 or int8 with a scale per row. """
+    return util.is_quantized(matrix) or matrix.dtype == np.float16
+
+
+class CompressedEmbedding(Layer):
+    def __init__(self, matrix, init_feed_dict, mask_zero=True, **kwargs):
+        """ Frozen embedding layer for a float16 or int8 quantized embedding matrix.
+
+            The matrix is kept in its stored dtype, only the gathered rows are widened to float32 (and for int8
+            multiplied by their row's scale) so a lookup costs the same as a regular Embedding while the matrix
+            takes a half or a quarter of the memory. The int8 matrix and its lookups are placed on the CPU as
+            there aren't GPU kernels for int8 variables.
+
+            Args:
+                matrix: A [vocab_size + 1, word_dim] float16 matrix or a structured array of (scale, values) rows
+                        as saved by util.quantize_embeddings.
+                init_feed_dict: Dict the placeholders the weights are initialized from are added to.
+                mask_zero: Whether id 0 is padding and should be masked.
+        """
+        super(CompressedEmbedding, self).__init__(**kwargs)
+        self.matrix = matrix
+        self.init_feed_dict = init_feed_dict
+        self.mask_zero = mask_zero
+        self.quantized = util.is_quantized(matrix)
+        self.device = '/cpu:0' if self.quantized else None
+
+    def build(self, input_shape):
+        values = self.matrix['values'] if self.quantized else self.matrix
+
+        with tf.device(self.device):
+            self.embeddings = self.add_weight('embeddings',
+                                              shape=values.shape,
+                                              dtype=tf.as_dtype(values.dtype),
+                                              initializer=placeholder_initializer(values, self.init_feed_dict,
+                                                                                  name='word_matrix'),
+                                              trainable=False)
+            if self.quantized:
+                self.scales = self.add_weight('scales',
+                                              shape=(len(self.matrix), ),
+                                              dtype=tf.float32,
+                                              initializer=placeholder_initializer(self.matrix['scale'],
+                                                                                  self.init_feed_dict,
+                                                                                  name='word_scales'),
+                                              trainable=False)
+        super(CompressedEmbedding, self).build(input_shape)
+
+    def call(self, x, training=None, mask=None):
+        """ Call function detailing this layers ops.
+            Args:
+                x: An int32 tensor of ids of shape [batch_size, seq_length].
+                training: Boolean flag for training mode.
+                mask: A mask tensor.
+        """
+        with tf.device(self.device):
+            embedding = tf.cast(tf.gather(self.embeddings, x), dtype=tf.float32)
+            if self.quantized:
+                embedding = embedding * tf.expand_dims(tf.gather(self.scales, x), axis=-1)
+        return embedding
+
+    def compute_mask(self, inputs, mask=None):
+        if not self.mask_zero:
+            return None
+        return tf.not_equal(inputs, 0)
+
+    def compute_output_shape(self, input_shape):
+        values = self.matrix['values'] if self.quantized else self.matrix
+        return tf.TensorShape(input_shape).concatenate([values.shape[-1]])
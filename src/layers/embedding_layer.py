@@ -33,8 +33,12 @@ class EmbeddingLayer(tf.keras.Model):
             Contextual embeddings must be passed in with the input when this layer is called, this is to support
             both fine-tuning of contextual embeddings and pre-processed embeddings.
 
+            The embedding matrices are kept out of the graph, the variables are initialized from placeholders so
+            init_feed_dict must be fed whenever the variable initializers are run.
+
             Args:
-                word_matrix: A [vocab_size + 1, word_dim] matrix containing word embeddings.
+                word_matrix: A [vocab_size + 1, word_dim] matrix containing word embeddings, float16 and int8
+                             quantized matrices are only dequantized after the lookup.
                 trainable_matrix: A [num_trainable + 1, word_dim] matrix containing trainable word embeddings.
                 character_matrix: A [num_chars + 1, char_dim] matrix containing character embeddings.
                 kernel_size: Width of the character convolution kernel.
@@ -54,28 +58,35 @@ class EmbeddingLayer(tf.keras.Model):
         self.use_trainable = use_trainable
         self.use_contextual = use_contextual
 
-        self.word_embedding = Embedding(input_dim=self.vocab_size,
-                                        output_dim=word_dim,
-                                        mask_zero=True,
-                                        trainable=False,
-                                        embeddings_initializer=tf.constant_initializer(word_matrix,
-                                                                                       verify_shape=True),
-                                        name='word_embedding')
+        # Matrices are fed in when running the variable initializers, see init_feed_dict.
+        self.init_feed_dict = {}
+
+        if layers.is_compressed(word_matrix):
+            self.word_embedding = layers.CompressedEmbedding(word_matrix, self.init_feed_dict, mask_zero=True,
+                                                             name='word_embedding')
+        else:
+            self.word_embedding = Embedding(input_dim=self.vocab_size,
+                                            output_dim=word_dim,
+                                            mask_zero=True,
+                                            trainable=False,
+                                            embeddings_initializer=layers.placeholder_initializer(
+                                                word_matrix, self.init_feed_dict, name='word_matrix'),
+                                            name='word_embedding')
 
         self.trainable_embedding = Embedding(input_dim=self.num_trainable,
                                              output_dim=word_dim,
                                              mask_zero=True,
                                              trainable=True,
-                                             embeddings_initializer=tf.constant_initializer(trainable_matrix,
-                                                                                            verify_shape=True),
+                                             embeddings_initializer=layers.placeholder_initializer(
+                                                 trainable_matrix, self.init_feed_dict, name='trainable_matrix'),
                                              name='trainable_word_embedding')
 
         self.char_embedding = Embedding(input_dim=self.char_vocab_size,
                                         output_dim=char_dim,
                                         mask_zero=True,
                                         trainable=True,
-                                        embeddings_initializer=tf.constant_initializer(character_matrix,
-                                                                                       verify_shape=True),
+                                        embeddings_initializer=layers.placeholder_initializer(
+                                            character_matrix, self.init_feed_dict, name='char_matrix'),
                                         name='char_embedding')
 
         self.char_conv = Conv1D(char_dim, kernel_size=kernel_size, activation='relu', padding='same', name='char_conv')
@@ -31,3 +31,28 @@ def apply_mask(inputs, mask, mask_value=-1e12):
 def create_mask_vector(mask, mask_value=-1e12):
     """ Converts a tf.bool tensor into a float32 mask filled with mask_value for padding positions. """
     return tf.cast(tf.logical_not(mask), dtype=tf.float32) * mask_value
+
+
+def placeholder_initializer(matrix, feed_dict, name=None):
+    """ Creates an initializer that initializes a variable from a placeholder rather than a constant.
+
+        A constant initializer embeds the whole matrix in the GraphDef, which slows building the graph, doubles the
+        memory used by the matrix, is written to every event file with the graph and can hit the 2GB GraphDef limit.
+        The placeholder + matrix are added to feed_dict instead, it must be fed when running the initializer.
+
+        Args:
+            matrix: A numpy matrix of initial values.
+            feed_dict: A dict the placeholder: matrix pair is added to.
+            name: Name of the placeholder.
+        Returns:
+            An initializer function.
+    """
+    def initializer(shape, dtype=None, partition_info=None):
+        if tf.TensorShape(shape).as_list() != list(matrix.shape):
+            raise ValueError('Expected a matrix of shape {}, got {}.'.format(
+                tf.TensorShape(shape).as_list(), list(matrix.shape)))
+        placeholder = tf.placeholder(dtype if dtype is not None else tf.as_dtype(matrix.dtype), shape=matrix.shape,
+                                     name=name)
+        feed_dict[placeholder] = matrix
+        return placeholder
+    return initializer
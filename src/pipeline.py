@@ -1,28 +1,46 @@
+import hashlib
+import json
 import os
 import tensorflow as tf
 import math
+from src import constants, util
 # useful link on pipelines: https://cs230-stanford.github.io/tensorflow-input-data.html
 
+# Approximate bytes of bookkeeping per tensor held in a tf.data cache, on top of the tensor data.
+TENSOR_OVERHEAD_BYTES = 128
 
-def tf_record_pipeline(filenames, buffer_size=1024, num_parallel_calls=4):
+
+def tf_record_pipeline(filenames, buffer_size=1024, num_parallel_calls=4, preindexed=False):
     """ Creates a dataset from a TFRecord file.
         Args:
             filenames: A list of paths to .tfrecord files.
             buffer_size: Number of records to buffer.
             num_parallel_calls: How many functions we run in parallel.
+            preindexed: Whether the records hold ids written by IndexedRecordWriter rather than strings.
         Returns:
             A `tf.data.Dataset` object.
     """
     int_feature = tf.FixedLenFeature([], tf.int64)
     str_feature = tf.FixedLenSequenceFeature([], tf.string, allow_missing=True)
-
-    features = {
-        'orig_tokens': str_feature,
-        'tokens': str_feature,
-        'tags': str_feature,
-        'num_tokens': int_feature,
-        'label': int_feature,
-    }
+    int_list_feature = tf.FixedLenSequenceFeature([], tf.int64, allow_missing=True)
+
+    if preindexed:
+        features = {
+            'words': int_list_feature,
+            'chars': int_list_feature,
+            'char_lengths': int_list_feature,
+            'tags': int_list_feature,
+            'num_tokens': int_feature,
+            'label': int_feature,
+        }
+    else:
+        features = {
+            'orig_tokens': str_feature,
+            'tokens': str_feature,
+            'tags': str_feature,
+            'num_tokens': int_feature,
+            'label': int_feature,
+        }
 
     def parse(proto):
         return tf.parse_single_example(proto, features=features)
@@ -73,29 +91,207 @@ def index_lookup(data, tables, char_limit=16, num_parallel_calls=4):
     return data
 
 
-def post_processing(data, num_classes, num_tags, num_parallel_calls=4):
-    """ Casts tensors to their intended dtypes and converts label tensor to be one-hot. """
+def preindexed_lookup(data, char_limit=16, num_parallel_calls=4):
+    """ Adds a map function to the dataset that offsets the ids stored by IndexedRecordWriter.
+
+        Records written by IndexedRecordWriter already hold the lookup table ids, so this does the same as
+        index_lookup without any string ops; chars are scattered from a flat array back into the padded
+        [num_tokens, num_chars] matrix given the number of chars in each token.
+
+        Args:
+            data: A `tf.data.Dataset` object.
+            char_limit: Max number of characters per word.
+            num_parallel_calls: An int for how many parallel maps we perform.
+        Returns:
+            A `tf.data.Dataset` object.
+    """
 
     def _lookup(fields):
+        # +1's to match index_lookup, the char padding is 0 before the +1 the same as sparse.to_dense.
+        mask = tf.sequence_mask(fields['char_lengths'])
+        chars = tf.scatter_nd(tf.where(mask), fields['chars'], tf.shape(mask, out_type=tf.int64)) + 1
+        fields['words'] = fields['words'] + 1
+        fields['chars'] = chars[:, :char_limit]
+        return fields
+
+    data = data.map(_lookup, num_parallel_calls=num_parallel_calls)
+    return data
+
+
+def cast_ids(data, num_parallel_calls=4):
+    """ Casts the ids of each row to int32 and drops the string fields, this is the form rows are cached in. """
+
+    def _cast(fields):
         out_dict = {
             'words': tf.cast(fields['words'], dtype=tf.int32),
             'chars': tf.cast(fields['chars'], dtype=tf.int32),
-            'tags': tf.one_hot(fields['tags'], num_tags, dtype=tf.float32),
+            'tags': tf.cast(fields['tags'], dtype=tf.int32),
             'num_tokens': tf.cast(fields['num_tokens'], dtype=tf.int32),
         }
 
         if 'label' in fields:
             out_dict.update({
-                'label': tf.one_hot(fields['label'], num_classes, dtype=tf.int32)
+                'label': tf.cast(fields['label'], dtype=tf.int32)
             })
 
         return out_dict
 
-    data = data.map(_lookup, num_parallel_calls=num_parallel_calls)
+    data = data.map(_cast, num_parallel_calls=num_parallel_calls)
 
     return data
 
 
+def one_hot_encode(data, num_classes, num_tags, num_parallel_calls=4):
+    """ Converts the tag + label tensors to be one-hot.
+
+        Runs after the cache as one-hot tags are num_tags floats per token, caching them would take ~num_tags times
+        the memory of the ids for the cost of a cheap op.
+    """
+
+    def _one_hot(fields):
+        fields['tags'] = tf.one_hot(fields['tags'], num_tags, dtype=tf.float32)
+
+        if 'label' in fields:
+            fields['label'] = tf.one_hot(fields['label'], num_classes, dtype=tf.int32)
+
+        return fields
+
+    data = data.map(_one_hot, num_parallel_calls=num_parallel_calls)
+
+    return data
+
+
+def estimate_cache_mb(examples, num_examples, char_limit=16):
+    """ Estimates the memory taken to cache num_examples rows after cast_ids from a sample of pre-processed rows.
+
+        Assumes every row is padded to char_limit characters, a fixed overhead per cached tensor is included as each
+        row is held as a separate set of tensors.
+
+        Args:
+            examples: A list of pre-processed rows with orig_tokens + tokens, e.g. those saved in examples.json.
+            num_examples: Number of rows to be cached.
+            char_limit: Max number of characters per word.
+        Returns:
+            The estimated size in MB.
+    """
+    if len(examples) == 0:
+        return 0.0
+
+    # words, chars, tags, num_tokens + label.
+    num_tensors = 5
+    row_bytes = [4 * (len(example['tokens']) * (char_limit + 2) + 2) + num_tensors * TENSOR_OVERHEAD_BYTES
+                 for example in examples]
+    return num_examples * (sum(row_bytes) / len(row_bytes)) / (1024 * 1024)
+
+
+def file_cache_path(cache_dir, name, record_paths, char_limit, preindexed):
+    """ Generates the path of a file cache, the name includes a hash of the records + settings the rows depend on so
+        a cache is never read for records it wasn't built from.
+
+        Args:
+            cache_dir: Directory to store the cache files in.
+            name: Name of the split being cached, e.g. train or val.
+            record_paths: A string filepath or list of string filepaths for .tfrecord files.
+            char_limit: Max number of characters per word.
+            preindexed: Whether the records hold ids written by IndexedRecordWriter.
+        Returns:
+            A string path prefix for tf.data.Dataset.cache.
+    """
+    record_paths = [record_paths] if isinstance(record_paths, str) else record_paths
+    key = hashlib.md5(json.dumps([[(path, os.path.getsize(path), os.path.getmtime(path)) for path in record_paths],
+                                  char_limit, preindexed]).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, '{}-{}'.format(name, key))
+
+
+def file_cache_is_complete(path):
+    """ Tests whether a file cache has been completely written, tf.data only writes the .index file last. """
+    return os.path.exists('{}.index'.format(path))
+
+
+def remove_stale_caches(cache_dir, name, path):
+    """ Removes the file caches of a split built from other records, and the lockfile of path left by a run stopped
+        before its cache was complete so it can be rebuilt. Only train mode writes file caches, so it's the only mode
+        that may call this, a lockfile it finds at startup can't be held by another process of the same run.
+
+        Args:
+            cache_dir: Directory the cache files are stored in.
+            name: Name of the split, e.g. train or val.
+            path: Path prefix of the current cache of the split, see file_cache_path.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    is_complete = file_cache_is_complete(path)
+
+    for file_name in os.listdir(cache_dir):
+        file_path = os.path.join(cache_dir, file_name)
+        if file_name.startswith('{}-'.format(name)) and not file_path.startswith(path):
+            os.remove(file_path)
+        elif file_path.startswith(path) and file_name.endswith('.lockfile') and not is_complete:
+            os.remove(file_path)
+
+
+def get_eval_cache_path(params, record_paths, preindexed=False):
+    """ Returns the val file cache written by train mode if it is complete, otherwise None to read the records.
+
+        Test mode reads the val rows about once so there's nothing to gain by caching them, and it never writes a
+        cache as train mode may be writing the same one.
+
+        Args:
+            params: A dictionary of parameters.
+            record_paths: A string filepath or list of string filepaths for the val .tfrecord files.
+            preindexed: Whether the records hold ids written by IndexedRecordWriter.
+        Returns:
+            A string path prefix for create_pipeline or None.
+    """
+    path = file_cache_path(util.pipeline_cache_directory(params), 'val', record_paths, params.char_limit, preindexed)
+    return path if file_cache_is_complete(path) else None
+
+
+def get_cache_paths(params, meta, examples, record_paths, preindexed=False):
+    """ Picks where the train + val pipelines cache their rows, in memory or in files within the run directory. Used by
+        train mode only, stale file caches of the run are removed, see remove_stale_caches.
+
+        With pipeline_cache auto both splits are cached in memory when their estimated size fits in cache_memory_mb,
+        otherwise the val rows are tried alone, e.g. Sentiment140 caches train rows in a file.
+
+        Args:
+            params: A dictionary of parameters.
+            meta: A dict of meta information with the number of train/val rows.
+            examples: A list of pre-processed rows to estimate the size of a row from.
+            record_paths: A tuple of the train + val .tfrecord file paths.
+            preindexed: Whether the records hold ids written by IndexedRecordWriter.
+        Returns:
+            A tuple of the train + val cache paths for create_pipeline, an empty string caches in memory.
+    """
+    cache = params.pipeline_cache.lower().strip()
+    if cache not in (constants.PipelineCaches.AUTO, constants.PipelineCaches.MEMORY, constants.PipelineCaches.FILE):
+        raise ValueError(constants.ErrorMessages.INVALID_PIPELINE_CACHE.format(cache=cache))
+
+    sizes = [estimate_cache_mb(examples, meta[key], params.char_limit) for key in ('num_train', 'num_val', )]
+
+    if cache == constants.PipelineCaches.MEMORY:
+        in_memory = [True, True]
+    elif cache == constants.PipelineCaches.FILE:
+        in_memory = [False, False]
+    elif sum(sizes) <= params.cache_memory_mb:
+        in_memory = [True, True]
+    else:
+        in_memory = [False, sizes[1] <= params.cache_memory_mb]
+
+    cache_dir = util.pipeline_cache_directory(params)
+    cache_paths = []
+
+    for name, paths, size, memory in zip(('train', 'val', ), record_paths, sizes, in_memory):
+        if memory:
+            cache_paths.append('')
+        else:
+            cache_paths.append(file_cache_path(cache_dir, name, paths, params.char_limit, preindexed))
+            remove_stale_caches(cache_dir, name, cache_paths[-1])
+        print('Caching {} rows in {} (estimated {:.0f} MB).'.format(name, 'memory' if memory else cache_paths[-1],
+                                                                    size))
+
+    return tuple(cache_paths)
+
+
 def create_buckets(bucket_size, max_size, bucket_ranges=None):
     """ Optionally generates bucket ranges if they aren't specified in the hparams.
         Args:
@@ -155,7 +351,8 @@ def create_lookup_tables(vocabs):
     return tables
 
 
-def create_pipeline(params, tables, record_paths, num_classes, num_tags, training=True):
+def create_pipeline(params, tables, record_paths, num_classes, num_tags, training=True, preindexed=False,
+                    cache_path=''):
     """ Function that creates an input pipeline for train/eval.
 
         Optionally uses bucketing to generate batches of a similar length. Output tensors
@@ -168,23 +365,33 @@ def create_pipeline(params, tables, record_paths, num_classes, num_tags, trainin
             training: Boolean value signifying whether we are in train mode.
             num_classes: Number of classes in the dataset.
             num_tags: Number of POS tags in the dataset.
+            preindexed: Whether the records hold ids written by IndexedRecordWriter, if so tables aren't used.
+            cache_path: Path to cache the mapped rows in, see get_cache_paths. Empty string caches in memory and None
+                        doesn't cache the rows.
         Returns:
             A `tf.data.Dataset` object and an initializable iterator.
     """
     parallel_calls = get_num_parallel_calls(params)
 
-    data = tf_record_pipeline(record_paths, params.tf_record_buffer_size, parallel_calls)
-    data = data.cache()
+    data = tf_record_pipeline(record_paths, params.tf_record_buffer_size, parallel_calls, preindexed=preindexed)
+
+    # Perform word -> index mapping.
+    if preindexed:
+        data = preindexed_lookup(data, char_limit=params.char_limit, num_parallel_calls=parallel_calls)
+    else:
+        data = index_lookup(data, tables, char_limit=params.char_limit,
+                            num_parallel_calls=parallel_calls)
+    data = cast_ids(data, num_parallel_calls=parallel_calls)
+    # Cache after the lookups so they only run in the first epoch, shuffling + bucketing still happen every epoch.
+    if cache_path is not None:
+        data = data.cache(cache_path)
 
     if training:
         data = data.apply(tf.data.experimental.shuffle_and_repeat(buffer_size=params.shuffle_buffer_size))
     else:
         data = data.repeat()
 
-    # Perform word -> index mapping.
-    data = index_lookup(data, tables, char_limit=params.char_limit,
-                        num_parallel_calls=parallel_calls)
-    data = post_processing(data, num_classes, num_tags, num_parallel_calls=parallel_calls)
+    data = one_hot_encode(data, num_classes, num_tags, num_parallel_calls=parallel_calls)
 
     if params.bucket and training:
         buckets = create_buckets(params.bucket_size, params.max_tokens, params.bucket_ranges)
@@ -1,3 +1,7 @@
-from .text import clean
-from .preprocess import process, get_data_sent_140, get_data_sem_eval
-from .record_writers import RecordWriter
+from .text import clean, TweetCleaner, SegmentationCache, segmentation_cache
+from .preprocess import process, process_stream, process_sharded, process_from_tokens, index_records, \
+    get_data_sent_140, iter_data_sent_140, get_data_sem_eval
+from .split import HashSplitter
+from .corpus_store import CorpusStore, CorpusStoreWriter
+from .token_cache import TokenCache, content_hash
+from .record_writers import RecordWriter, ShuffledRecordWriter, IndexedRecordWriter
@@ -0,0 +1,292 @@
+import os
+from array import array
+from collections import Counter
+import numpy as np
+from src import constants, util
+
+TOKEN_COLUMNS = ('orig_tokens', 'tokens', 'tags')
+
+
+def encode_strings(strings):
+    """ Packs a list of strings into a uint8 array of their concatenated UTF-8 bytes and an int64 array of offsets. """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def decode_strings(blob, offsets):
+    """ Unpacks strings packed by encode_strings. """
+    data = blob.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+
+def array_path(path, name):
+    return os.path.join(path, name + '.npy')
+
+
+def part_path(path, name):
+    return os.path.join(path, name + '.part')
+
+
+def part_to_array(path, name, dtype, offsets=False, block_size=1 << 22):
+    """ Converts a file of raw values appended by CorpusStoreWriter into a .npy array, a block at a time.
+        Args:
+            path: Directory of the store.
+            name: Name of the array.
+            dtype: Numpy dtype of the values in the file.
+            offsets: Whether the values are lengths to save as offsets, e.g. a leading 0 followed by their cumsum.
+            block_size: Number of values to copy at a time.
+    """
+    dtype = np.dtype(dtype)
+    source_path = part_path(path, name)
+    count = os.path.getsize(source_path) // dtype.itemsize
+    length = count + 1 if offsets else count
+
+    if length == 0:
+        np.save(array_path(path, name), np.zeros(0, dtype=dtype))
+        os.remove(source_path)
+        return
+
+    values = np.lib.format.open_memmap(array_path(path, name), mode='w+', dtype=dtype, shape=(length, ))
+    position, total = (1, 0) if offsets else (0, 0)
+
+    with open(source_path, 'rb') as f:
+        if offsets:
+            values[0] = 0
+        while True:
+            block = np.fromfile(f, dtype=dtype, count=block_size)
+            if len(block) == 0:
+                break
+            if offsets:
+                block = np.cumsum(block) + total
+                total = block[-1]
+            values[position:position + len(block)] = block
+            position += len(block)
+
+    values.flush()
+    del values
+    os.remove(source_path)
+
+
+class CorpusStoreWriter(object):
+    def __init__(self, path, flush_rows=50000):
+        """ Writes tokenized rows to a CorpusStore one row at a time.
+
+            Each token column is dictionary encoded as it is written, so only one int32 id is held per token and
+            one copy of each distinct token string. Every flush_rows rows the text + ids are appended to files in
+            the store directory, so memory is bounded by the number of distinct tokens rather than the number of rows.
+            The text + label of rows dropped for having no tokens are stored too, so the split can be fit on every row.
+
+            Args:
+                path: Directory to save the store in.
+                flush_rows: Number of rows buffered before they're appended to disk.
+        """
+        self.path = path
+        self.flush_rows = flush_rows
+        self.num_rows = 0
+        self.vocabs = {column: {} for column in TOKEN_COLUMNS}
+        self.num_dropped = 0
+        self.parts = ['text_blob', 'text_lengths', 'labels', 'dropped_text_blob', 'dropped_text_lengths',
+                      'dropped_labels'] + \
+                     ['{}_{}'.format(column, key) for column in TOKEN_COLUMNS for key in ('ids', 'lengths', )]
+        util.make_dirs(self.path)
+
+        for name in self.parts:
+            if util.file_exists(part_path(self.path, name)):
+                os.remove(part_path(self.path, name))
+
+        self.reset_buffers()
+
+    def reset_buffers(self):
+        self.texts = []
+        self.text_lengths = array('q')
+        self.labels = array('i')
+        self.dropped_texts = []
+        self.dropped_text_lengths = array('q')
+        self.dropped_labels = array('i')
+        self.ids = {column: array('i') for column in TOKEN_COLUMNS}
+        self.lengths = {column: array('q') for column in TOKEN_COLUMNS}
+
+    def add(self, tweet):
+        """ Adds a pre-processed tweet, a dict with text, orig_tokens, tokens, tags and label keys. """
+        encoded = tweet['text'].encode('utf-8')
+        self.texts.append(encoded)
+        self.text_lengths.append(len(encoded))
+        self.labels.append(tweet['label'])
+
+        for column in TOKEN_COLUMNS:
+            vocab = self.vocabs[column]
+            ids = self.ids[column]
+
+            for token in tweet[column]:
+                token_id = vocab.get(token)
+                if token_id is None:
+                    token_id = vocab[token] = len(vocab)
+                ids.append(token_id)
+
+            self.lengths[column].append(len(tweet[column]))
+
+        self.num_rows += 1
+
+        if len(self.labels) + len(self.dropped_labels) >= self.flush_rows:
+            self.flush()
+
+    def add_dropped(self, text, label):
+        """ Adds the text + label of a row dropped for having no tokens, these are only used to fit the splitter. """
+        encoded = text.encode('utf-8')
+        self.dropped_texts.append(encoded)
+        self.dropped_text_lengths.append(len(encoded))
+        self.dropped_labels.append(label)
+        self.num_dropped += 1
+
+        if len(self.labels) + len(self.dropped_labels) >= self.flush_rows:
+            self.flush()
+
+    def flush(self):
+        """ Appends the buffered rows to the files in the store directory. """
+        buffers = {
+            'text_blob': b''.join(self.texts),
+            'text_lengths': self.text_lengths.tobytes(),
+            'labels': self.labels.tobytes(),
+            'dropped_text_blob': b''.join(self.dropped_texts),
+            'dropped_text_lengths': self.dropped_text_lengths.tobytes(),
+            'dropped_labels': self.dropped_labels.tobytes(),
+        }
+
+        for column in TOKEN_COLUMNS:
+            buffers[column + '_ids'] = self.ids[column].tobytes()
+            buffers[column + '_lengths'] = self.lengths[column].tobytes()
+
+        for name, data in buffers.items():
+            with open(part_path(self.path, name), 'ab') as f:
+                f.write(data)
+
+        self.reset_buffers()
+
+    def save(self, classes, settings):
+        """ Saves the store.
+            Args:
+                classes: A dict of class: index mappings used for the labels.
+                settings: A json serializable dict of the settings the rows were tokenized with.
+        """
+        self.flush()
+        names = []
+
+        for prefix in ('', 'dropped_', ):
+            part_to_array(self.path, prefix + 'text_blob', np.uint8)
+            part_to_array(self.path, prefix + 'text_lengths', np.int64, offsets=True)
+            os.replace(array_path(self.path, prefix + 'text_lengths'), array_path(self.path, prefix + 'text_offsets'))
+            part_to_array(self.path, prefix + 'labels', np.int32)
+            names += [prefix + 'text_blob', prefix + 'text_offsets', prefix + 'labels']
+
+        for column in TOKEN_COLUMNS:
+            part_to_array(self.path, column + '_ids', np.int32)
+            part_to_array(self.path, column + '_lengths', np.int64, offsets=True)
+            os.replace(array_path(self.path, column + '_lengths'), array_path(self.path, column + '_offsets'))
+            vocab_blob, vocab_offsets = encode_strings(list(self.vocabs[column]))
+            np.save(array_path(self.path, column + '_vocab_blob'), vocab_blob)
+            np.save(array_path(self.path, column + '_vocab_offsets'), vocab_offsets)
+            names += [column + '_ids', column + '_offsets', column + '_vocab_blob', column + '_vocab_offsets']
+
+        util.save_json(os.path.join(self.path, constants.FileNames.CORPUS_META), {
+            'num_rows': self.num_rows,
+            'num_dropped': self.num_dropped,
+            'classes': classes,
+            'settings': settings,
+            'arrays': sorted(names),
+        })
+
+
+class CorpusStore(object):
+    def __init__(self, arrays, meta):
+        """ Columnar store of a tokenized corpus, used to rebuild indexes and records without re-tokenizing.
+
+            The raw text of each row is kept as one UTF-8 blob with offsets, while the original tokens, corrected
+            tokens and tags are each a dictionary of distinct tokens plus a flat int32 array of token ids and offsets
+            marking where each row starts (a ragged array). Word, character and tag counts are computed directly on
+            the id arrays.
+
+            Args:
+                arrays: A dict of the arrays saved by CorpusStoreWriter.
+                meta: The stores meta information, number of rows, classes and tokenizer settings.
+        """
+        self.arrays = arrays
+        self.meta = meta
+        self.classes = meta['classes']
+        self.settings = meta['settings']
+        self.vocabs = {column: decode_strings(arrays[column + '_vocab_blob'], arrays[column + '_vocab_offsets'])
+                       for column in TOKEN_COLUMNS}
+
+    @staticmethod
+    def load(path, mmap=True):
+        """ Loads a store saved by CorpusStoreWriter.
+            Args:
+                path: Directory the store was saved in.
+                mmap: Whether to memory map the arrays rather than reading them into memory.
+            Returns:
+                A CorpusStore.
+        """
+        meta = util.load_json(os.path.join(path, constants.FileNames.CORPUS_META))
+        mmap_mode = 'r' if mmap else None
+        arrays = {name: np.load(array_path(path, name), mmap_mode=mmap_mode) for name in meta['arrays']}
+        return CorpusStore(arrays, meta)
+
+    def __len__(self):
+        return self.meta['num_rows']
+
+    def __iter__(self):
+        """ Iterates over the rows as pre-processed tweet dicts. """
+        text_blob = self.arrays['text_blob'].tobytes()
+        text_offsets = self.arrays['text_offsets'].tolist()
+        labels = self.arrays['labels'].tolist()
+        columns = [(self.vocabs[column], self.arrays[column + '_ids'], self.arrays[column + '_offsets'].tolist())
+                   for column in TOKEN_COLUMNS]
+
+        for i in range(len(self)):
+            tweet = {
+                'text': text_blob[text_offsets[i]:text_offsets[i + 1]].decode('utf-8'),
+                'label': labels[i],
+            }
+
+            for column, (vocab, ids, offsets) in zip(TOKEN_COLUMNS, columns):
+                tweet[column] = [vocab[token_id] for token_id in ids[offsets[i]:offsets[i + 1]].tolist()]
+
+            tweet['num_tokens'] = len(tweet['tokens'])
+            yield tweet
+
+    def split_rows(self):
+        """ Yields the (text, label) of every row read, including those dropped for having no tokens, so a splitter
+            fit on them matches one fit on the original data. Stores saved before dropped rows were kept only yield
+            the tokenized rows.
+        """
+        for prefix in ('', 'dropped_', ):
+            if prefix + 'labels' not in self.arrays:
+                continue
+            texts = decode_strings(self.arrays[prefix + 'text_blob'], self.arrays[prefix + 'text_offsets'])
+            for text, label in zip(texts, self.arrays[prefix + 'labels'].tolist()):
+                yield text, label
+
+    def counters(self):
+        """ Returns word, char and tag Counters equal to calling Tokenizer.count on every row. """
+        token_vocab = self.vocabs['tokens']
+        token_counts = np.bincount(self.arrays['tokens_ids'], minlength=len(token_vocab))
+        word_counter = Counter({token: int(count) for token, count in zip(token_vocab, token_counts) if count > 0})
+
+        char_counter = Counter()
+        for token, count in word_counter.items():
+            for char in token:
+                char_counter[char] += count
+
+        # Tokenizer.count zips tokens with tags, so only the first num_tokens tags of each row are counted.
+        tag_offsets = self.arrays['tags_offsets']
+        tag_lengths = np.diff(tag_offsets)
+        num_tokens = np.diff(self.arrays['tokens_offsets'])
+        positions = np.arange(tag_offsets[-1]) - np.repeat(tag_offsets[:-1], tag_lengths)
+        counted = positions < np.repeat(num_tokens, tag_lengths)
+        tag_vocab = self.vocabs['tags']
+        tag_counts = np.bincount(self.arrays['tags_ids'][counted], minlength=len(tag_vocab))
+        tag_counter = Counter({tag: int(count) for tag, count in zip(tag_vocab, tag_counts) if count > 0})
+
+        return word_counter, char_counter, tag_counter
@@ -1,47 +1,199 @@
+import itertools
+import multiprocessing
+import os
 import random
+import shutil
+from collections import Counter
 
 import numpy as np
-import pandas as pd
 from tqdm import tqdm
 
-from src import util, tokenizer as toke
+from src import constants, profiling, util, tokenizer as toke
 from src import preprocessing as prepro
-from sklearn.model_selection import train_test_split
 
 
 def get_data_sent_140(path, max_examples=-1):
+    import pandas as pd
     df = pd.read_csv(path, names=['class', 'id', 'date', 'query', 'user', 'text'], encoding='latin-1', index_col=1)
     df['class'] = df['class'].replace({0: 'negative', 4: 'positive'})
     df = df[:max_examples]
     return df
 
 
-def get_data_sem_eval(data_dir):
-    df = util.concat_load_tsvs(data_dir)
+def iter_data_sent_140(path, chunk_size=50000, max_examples=-1):
+    """ Reads the Sentiment140 csv in chunks, only loading the class + text columns.
+        Args:
+            path: Path to the Sentiment140 csv.
+            chunk_size: Number of rows per chunk.
+            max_examples: Maximum number of rows to read, -1 to read every row.
+        Returns:
+            A generator of DataFrames with class and text columns.
+    """
+    import pandas as pd
+    chunks = pd.read_csv(path, names=['class', 'id', 'date', 'query', 'user', 'text'], usecols=['class', 'text'],
+                         dtype={'class': np.int8, 'text': str}, encoding='latin-1', chunksize=chunk_size,
+                         nrows=max_examples if max_examples > 0 else None)
+
+    for chunk in chunks:
+        chunk['class'] = chunk['class'].replace({0: 'negative', 4: 'positive'})
+        yield chunk
+
+
+def get_data_sem_eval(data_dir, cache_dir=None):
+    df = util.concat_load_tsvs(data_dir, cache_dir=cache_dir)
     return df
 
 
-def fit_and_extract(data_set, tokenizer, classes):
+def fit_and_extract(data_set, tokenizer, classes, batch_size=1000, num_workers=1, token_cache=None,
+                    chunk_size=50000, dropped=None):
     tweets = []
+    texts = data_set['text'].tolist()
+    labels = data_set['class'].tolist()
 
-    for index, tweet in tqdm(data_set.iterrows()):
-        tweet_text = prepro.clean(tweet['text'])
-        orig_tokens, modified_tokens, pos_tags = tokenizer.fit_on_texts(tweet_text)[-1]
+    if token_cache is None:
+        with profiling.stage('clean', rows=len(texts)):
+            cleaned = [prepro.clean(text) for text in tqdm(texts)]
+        tokenized = tokenizer.fit_on_texts_batched(cleaned, batch_size=batch_size, num_workers=num_workers)
+    else:
+        tokenized = fit_incremental(texts, tokenizer, token_cache, chunk_size=chunk_size, batch_size=batch_size,
+                                    num_workers=num_workers)
+
+    # Tokenizing happens lazily as rows are consumed, so only time spent inside the generator is recorded.
+    tokenized = profiling.iterate('tokenize', tokenized, batch_size=batch_size)
+
+    for text, label, (orig_tokens, modified_tokens, pos_tags) in tqdm(zip(texts, labels, tokenized), total=len(texts)):
         num_tokens = len(modified_tokens)
 
         if num_tokens > 0:
             tweets.append({
-                'text': tweet['text'],
+                'text': text,
                 'orig_tokens': orig_tokens,
                 'tokens': modified_tokens,
                 'tags': pos_tags,
                 'num_tokens': num_tokens,
-                'label': classes[tweet['class']],
+                'label': classes[label],
             })
+        elif dropped is not None:
+            dropped.append((text, classes[label], ))
 
     return tweets, tokenizer
 
 
+def fit_incremental(texts, tokenizer, token_cache, chunk_size=50000, batch_size=1000, num_workers=1):
+    """ Fits the tokenizer on texts, only cleaning + tokenizing rows that aren't already in the token cache.
+
+        Texts are processed in chunks, newly tokenized rows of each chunk are checkpointed to the cache as soon as
+        the chunk completes so an interrupted run picks up from the last completed chunk. Cached rows are still
+        counted so the tokenizer ends up in the same state as fitting on every row. The rows missing from the cache
+        of every chunk are streamed through a single fit_on_texts_batched call, so the worker pool is only started
+        once rather than once per chunk.
+
+        Args:
+            texts: List of raw strings.
+            tokenizer: A Tokenizer.
+            token_cache: A TokenCache that has been loaded.
+            chunk_size: Number of rows per checkpointed chunk.
+            batch_size: Number of texts spaCy processes per batch.
+            num_workers: Number of worker processes used for tokenizing.
+        Returns:
+            A generator of (original tokens, corrected tokens, tags) tuples in the same order as texts.
+    """
+    tokenizer.just_fit = True
+    # Plans are dropped once both the text stream + the loop below have passed their chunk.
+    plans = {}
+    reached, consumed = [0], [0]
+
+    def get_plan(chunk):
+        """ Looks up the cached rows of a chunk, shared by the text stream + the loop below. """
+        if chunk not in plans:
+            chunk_texts = texts[chunk * chunk_size:(chunk + 1) * chunk_size]
+            keys = [prepro.content_hash(text) for text in chunk_texts]
+            rows = [token_cache.get(key) for key in keys]
+            plans[chunk] = (chunk_texts, keys, rows, [i for i, row in enumerate(rows) if row is None], )
+        return plans[chunk]
+
+    num_chunks = (len(texts) + chunk_size - 1) // chunk_size
+
+    def missing_texts():
+        # The pool reads ahead of the loop below, possibly into later chunks.
+        for chunk in range(num_chunks):
+            chunk_texts, _, _, missing = get_plan(chunk)
+            reached[0] = chunk + 1
+            if chunk < consumed[0]:
+                del plans[chunk]
+
+            for i in missing:
+                yield prepro.clean(chunk_texts[i])
+
+    tokenized = tokenizer.fit_on_texts_batched(missing_texts(), batch_size=batch_size, num_workers=num_workers)
+
+    for chunk in tqdm(range(num_chunks)):
+        _, keys, rows, missing = get_plan(chunk)
+        consumed[0] = chunk + 1
+        if chunk < reached[0]:
+            del plans[chunk]
+
+        if len(missing) > 0:
+            new_rows = list(itertools.islice(tokenized, len(missing)))
+            token_cache.add_chunk([keys[i] for i in missing], new_rows)
+
+            for i, row in zip(missing, new_rows):
+                rows[i] = row
+
+        missing = set(missing)
+
+        for i, (orig_tokens, modified_tokens, pos_tags) in enumerate(rows):
+            # Newly tokenized rows were counted by fit_on_texts_batched.
+            if i not in missing:
+                tokenizer.count(modified_tokens, pos_tags)
+            yield orig_tokens, modified_tokens, pos_tags
+
+    # Shuts down the worker pool.
+    tokenized.close()
+
+
+def token_cache_settings(params):
+    """ The settings that change how a row is cleaned + tokenized, cached rows are only reused if these match. """
+    embeddings_stat = os.stat(params.embeddings_path)
+    return {
+        'tokenizer_backend': util.get_tokenizer_backend(params),
+        'embeddings_path': os.path.abspath(params.embeddings_path),
+        'embeddings_size': embeddings_stat.st_size,
+        'embeddings_mtime': embeddings_stat.st_mtime,
+        'trainable_words': sorted(params.trainable_words),
+        'error_correct': True,
+    }
+
+
+def load_token_cache(params, texts=None):
+    """ Loads the token cache, with texts rows of any other text are pruned from it. """
+    token_cache = prepro.TokenCache(util.token_cache_directory(params), token_cache_settings(params))
+    token_cache.load({prepro.content_hash(text) for text in texts} if texts is not None else None)
+    return token_cache
+
+
+class ExampleSample(object):
+    def __init__(self, num_examples=1000):
+        """ Keeps a uniform random sample of a stream of tweets via reservoir sampling, used for examples.json when
+            the full list of tweets is never held in memory.
+
+            Args:
+                num_examples: Size of the sample.
+        """
+        self.num_examples = num_examples
+        self.examples = []
+        self.seen = 0
+
+    def add(self, tweet):
+        self.seen += 1
+        if len(self.examples) < self.num_examples:
+            self.examples.append(tweet)
+        else:
+            i = random.randrange(self.seen)
+            if i < self.num_examples:
+                self.examples[i] = tweet
+
+
 def get_examples(tweets, num_examples=1000):
     shuffled = tweets
     random.shuffle(shuffled)
@@ -49,86 +201,549 @@ def get_examples(tweets, num_examples=1000):
     return shuffled
 
 
-def process(params, data, print_classes=True):
-    directories = util.get_directories(params)
-    util.make_dirs(directories)
-    # path to save tf_records and a random sample of data.
-    train_record_path, val_record_path = util.tf_record_paths(params)
+def load_segmentation_cache(params):
+    """ Starts from any hashtag segmentations saved by a previous run. """
+    prepro.segmentation_cache.resize(params.segmentation_cache_size)
+    prepro.segmentation_cache.load(util.segmentation_cache_path(params))
+
+
+def load_vocab(params):
+    """ Reads the words with embeddings into a vocab, the vectors are only read once the word index is known. """
+    print('Loading Embeddings vocab...')
+    with profiling.stage('embeddings_vocab'):
+        vocab = util.read_embeddings_vocab(params.embeddings_path, use_cache=params.cache_embeddings,
+                                           num_workers=util.get_num_workers(params))
+    return vocab
+
+
+def remove_records_manifest(params):
+    """ Removes the shard manifest left by a previous sharded run so the single .tfrecord files are used instead. """
+    manifest_path = util.records_manifest_path(params)
+    if util.file_exists(manifest_path):
+        os.remove(manifest_path)
+
+
+def create_tokenizer(params, vocab):
+    return toke.Tokenizer(max_words=params.max_words + 1,
+                          max_chars=params.max_chars + 1,
+                          vocab=vocab,
+                          lower=False,
+                          oov_token=params.oov_token,
+                          min_word_occurrence=params.min_word_occur,
+                          min_char_occurrence=params.min_char_occur,
+                          trainable_words=params.trainable_words,
+                          filters=None,
+                          backend=util.get_tokenizer_backend(params),
+                          correction_cache_size=params.correction_cache_size)
+
+
+def save_processed(params, tokenizer, classes, meta, examples):
+    """ Builds the word/char indexes + embedding matrices from the fit tokenizer and saves them alongside the meta
+        information, classes and examples.
+
+        Args:
+            params: A dictionary of parameters.
+            tokenizer: A Tokenizer that has been fit on the dataset.
+            classes: A dict of class: index mappings.
+            meta: A dict of meta information, e.g. number of train/val rows.
+            examples: A list of example tweets.
+    """
     examples_path = util.examples_path(params)
     meta_path = util.meta_path(params)
     classes_path = util.classes_path(params)
     # Get paths for saving embedding related info.
     word_index_path, trainable_index_path, char_index_path, pos_index_path = util.index_paths(params)
+    word_vocab_path, trainable_vocab_path, char_vocab_path, pos_vocab_path = util.vocab_paths(params)
     word_embeddings_path, trainable_embeddings_path, char_embeddings_path = util.embedding_paths(params)
 
+    print('Hashtag segmentation cache: {}'.format(prepro.segmentation_cache.info()))
+    print('Token correction cache: {}'.format(tokenizer.correction_cache_info()))
+
+    with profiling.stage('build_indexes'):
+        tokenizer.init()
+    word_index = tokenizer.word_index
+    char_index = tokenizer.char_index
+    trainable_index = util.index_from_list(params.trainable_words)
+
+    with profiling.stage('embedding_matrix', rows=len(word_index)):
+        embedding_matrix = util.load_embedding_file(path=params.embeddings_path,
+                                                    word_index=word_index,
+                                                    embedding_dimensions=params.embed_dim,
+                                                    trainable_embeddings=params.trainable_words,
+                                                    use_cache=params.cache_embeddings,
+                                                    dtype=util.get_embedding_dtype(params))
+        print('Word embeddings: {} x {} {}, {:.1f} MB'.format(len(embedding_matrix), params.embed_dim,
+                                                              util.get_embedding_dtype(params),
+                                                              embedding_matrix.nbytes / (1024 * 1024)))
+
+        trainable_matrix = util.generate_matrix(index=trainable_index, embedding_dimensions=params.embed_dim)
+        char_matrix = util.generate_matrix(index=char_index, embedding_dimensions=params.char_dim)
+
+    meta.update({
+        'num_classes': len(classes),
+        'num_tags': len(tokenizer.tag_index),
+        'tokenizer_backend': tokenizer.backend,
+    })
+
+    with profiling.stage('save_outputs'):
+        # Save meta information, e.g. number of train/val/classes
+        util.save_json(meta_path, meta)
+        util.save_json(classes_path, classes)
+        # Save a random sample of the data.
+        util.save_json(examples_path, examples)
+        # Save the word index mapping of word:index for both the pre-trained and trainable embeddings.
+        util.save_json(word_index_path, word_index)
+        util.save_json(char_index_path, char_index)
+        util.save_json(trainable_index_path, trainable_index)
+        util.save_json(pos_index_path, tokenizer.tag_index)
+        # Save each index as a dense array of words ordered by id so loaders don't need to sort the .json index.
+        np.save(word_vocab_path, util.index_to_array(word_index))
+        np.save(char_vocab_path, util.index_to_array(char_index))
+        np.save(trainable_vocab_path, util.index_to_array(trainable_index))
+        np.save(pos_vocab_path, util.index_to_array(tokenizer.tag_index))
+        # Save the trainable embeddings matrix.
+        np.save(trainable_embeddings_path, trainable_matrix)
+        # Save the full embeddings matrix
+        np.save(word_embeddings_path, embedding_matrix)
+        np.save(char_embeddings_path, char_matrix)
+        prepro.segmentation_cache.save(util.segmentation_cache_path(params))
+
+
+def index_records(params):
+    """ Rewrites the .tfrecord files written by a run with the word, char and tag ids of each row.
+
+        Runs after save_processed as the indexes aren't known while records are written, the meta file is marked as
+        preindexed so train + test read the records with pipeline.preindexed_lookup instead of the lookup tables.
+
+        Args:
+            params: A dictionary of parameters.
+    """
+    word_index_path, _, char_index_path, pos_index_path = util.index_paths(params)
+    word_vocab_path, _, char_vocab_path, pos_vocab_path = util.vocab_paths(params)
+    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path),
+                                   array_paths=(word_vocab_path, char_vocab_path, pos_vocab_path))
+    writer = prepro.IndexedRecordWriter(params.max_tokens, vocabs)
+    meta_path = util.meta_path(params)
+    meta = util.load_json(meta_path)
+    paths = []
+
+    for split_paths in util.tf_record_paths(params):
+        paths += [split_paths] if isinstance(split_paths, str) else split_paths
+
+    with profiling.stage('index_records', rows=meta['num_train'] + meta['num_val']):
+        for path in tqdm(paths):
+            writer.convert(path, path)
+
+    meta['preindexed'] = True
+    util.save_json(meta_path, meta)
+
+
+def create_splitter(params, rows=None):
+    """ Creates a HashSplitter, with stratify_split it is fit on rows, an iterable of (text, label) tuples. """
+    splitter = prepro.HashSplitter(val_split=params.val_split, stratify=params.stratify_split)
+    if params.stratify_split:
+        splitter.fit(rows)
+    return splitter
+
+
+def split_tweets(tweets, splitter):
+    """ Splits a list of tweets into train and val lists with a HashSplitter. """
+    train, val = [], []
+
+    for tweet in tweets:
+        if splitter.is_val(tweet['text'], tweet['label']):
+            val.append(tweet)
+        else:
+            train.append(tweet)
+
+    return train, val
+
+
+def split_and_write(params, tweets, splitter=None):
+    """ Splits tweets into train/val and writes each to a .tfrecord file.
+        Args:
+            params: A dictionary of parameters.
+            tweets: List of pre-processed tweets.
+            splitter: Optional HashSplitter, by default one is created and fit on tweets.
+        Returns:
+            The train and val lists of tweets.
+    """
+    remove_records_manifest(params)
+    train_record_path, val_record_path = util.tf_record_paths(params)
+
+    with profiling.stage('split', rows=len(tweets)):
+        if splitter is None:
+            splitter = create_splitter(params, [(tweet['text'], tweet['label']) for tweet in tweets])
+        train, val = split_tweets(tweets, splitter)
+
+    with profiling.stage('write_records', rows=len(train) + len(val)):
+        writer = prepro.RecordWriter(params.max_tokens)
+        writer.write(train_record_path, train)
+        writer.write(val_record_path, val)
+
+    return train, val
+
+
+def remove_corpus(params):
+    """ Removes the tokenized corpus saved by a previous run so it can't be mistaken for the current data. """
+    corpus_path = util.corpus_directory(params)
+    if util.directory_exists(corpus_path):
+        shutil.rmtree(corpus_path)
+
+
+def save_corpus(params, tweets, classes, dropped=()):
+    """ Saves the tokenized rows so process_from_tokens can rebuild everything without re-tokenizing, dropped is a
+        list of the (text, class id) of rows without tokens.
+    """
+    with profiling.stage('save_corpus', rows=len(tweets)):
+        writer = prepro.CorpusStoreWriter(util.corpus_directory(params))
+        for tweet in tweets:
+            writer.add(tweet)
+        for text, label in dropped:
+            writer.add_dropped(text, label)
+        writer.save(classes, token_cache_settings(params))
+
+
+def process(params, data, print_classes=True):
+    directories = util.get_directories(params)
+    util.make_dirs(directories)
+    remove_corpus(params)
+
     if print_classes:
         print(data['class'].value_counts())
 
-    # Read the embedding index and create a vocab of words with embeddings.
-    print('Loading Embeddings, this may take some time...')
-    embedding_index = util.read_embeddings_file(params.embeddings_path)
-    vocab = set([e for e, _ in embedding_index.items()])
-
-    tokenizer = toke.Tokenizer(max_words=params.max_words + 1,
-                               max_chars=params.max_chars + 1,
-                               vocab=vocab,
-                               lower=False,
-                               oov_token=params.oov_token,
-                               min_word_occurrence=params.min_word_occur,
-                               min_char_occurrence=params.min_char_occur,
-                               trainable_words=params.trainable_words,
-                               filters=None)
+    load_segmentation_cache(params)
+    vocab = load_vocab(params)
+    tokenizer = create_tokenizer(params, vocab)
 
     classes = data['class'].unique()
     classes = util.index_from_list(classes, skip_zero=False)
 
-    tweets, tokenizer = fit_and_extract(data, tokenizer, classes)
-
-    tokenizer.init()
-    word_index = tokenizer.word_index
-    char_index = tokenizer.char_index
-    trainable_index = util.index_from_list(params.trainable_words)
+    token_cache = load_token_cache(params, data['text'].tolist()) if params.incremental_preprocessing else None
+    dropped = [] if params.save_corpus else None
 
-    embedding_matrix = util.load_embedding_file(path=params.embeddings_path,
-                                                word_index=word_index,
-                                                embedding_dimensions=params.embed_dim,
-                                                trainable_embeddings=params.trainable_words,
-                                                embedding_index=embedding_index)
+    tweets, tokenizer = fit_and_extract(data, tokenizer, classes,
+                                        batch_size=params.tokenizer_batch_size,
+                                        num_workers=util.get_num_workers(params),
+                                        token_cache=token_cache,
+                                        chunk_size=params.checkpoint_chunk_size,
+                                        dropped=dropped)
 
-    trainable_matrix = util.generate_matrix(index=trainable_index, embedding_dimensions=params.embed_dim)
-    char_matrix = util.generate_matrix(index=char_index, embedding_dimensions=params.char_dim)
+    if token_cache is not None:
+        print('Token cache: {}'.format(token_cache.info()))
 
     print('Number of Data Samples:' + str(len(tweets)))
 
-    train, val = train_test_split(tweets, test_size=0.2)
+    if params.save_corpus:
+        save_corpus(params, tweets, classes, dropped)
+        del dropped
 
-    num_classes = len(classes)
-    print('Num classes: ' + str(num_classes))
+    # Fit on every row read, including those dropped for having no tokens, the same as the stream + sharded modes.
+    splitter = create_splitter(params, zip(data['text'].tolist(), [classes[label] for label in data['class'].tolist()]))
+    train, val = split_and_write(params, tweets, splitter)
+    del tweets
+    print('Num classes: ' + str(len(classes)))
+
+    meta = {
+        'num_train': len(train),
+        'num_val': len(val),
+    }
 
-    writer = prepro.RecordWriter(params.max_tokens)
-    writer.write(train_record_path, train)
-    writer.write(val_record_path, val)
+    save_processed(params, tokenizer, classes, meta, get_examples(train))
+
+
+def iter_class_ids(chunks):
+    """ Yields (text, class id) tuples from DataFrame chunks, classes are indexed in order of first appearance. """
+    classes = {}
+    for chunk in chunks:
+        for text, label in zip(chunk['text'].tolist(), chunk['class'].tolist()):
+            if label not in classes:
+                classes[label] = len(classes)
+            yield text, classes[label]
+
+
+def process_stream(params, chunks, print_classes=True, fit_chunks=None):
+    """ Streaming version of process for datasets too large to hold in memory e.g. Sentiment140.
+
+        Rows are cleaned, tokenized and written to shuffled .tfrecord files as they are read, only the tokenizer
+        counters and a bounded sample of examples are kept, so peak memory doesn't grow with the dataset.
+
+        Args:
+            params: A dictionary of parameters.
+            chunks: An iterable of DataFrames with class and text columns.
+            print_classes: Whether to print the number of rows per class.
+            fit_chunks: A second iterable of the same DataFrames, only read with stratify_split to fit the splitter
+                        before any rows are written.
+    """
+    directories = util.get_directories(params)
+    util.make_dirs(directories)
+    remove_records_manifest(params)
+    # path to save tf_records and a random sample of data.
+    train_record_path, val_record_path = util.tf_record_paths(params)
+
+    load_segmentation_cache(params)
+    vocab = load_vocab(params)
+    tokenizer = create_tokenizer(params, vocab)
+
+    # Classes are indexed in order of first appearance, the same as data['class'].unique().
+    classes = {}
+    class_counts = Counter()
+    sample = ExampleSample()
+    splitter = create_splitter(params, iter_class_ids(fit_chunks) if params.stratify_split else None)
+    remove_corpus(params)
+    corpus_writer = prepro.CorpusStoreWriter(util.corpus_directory(params), flush_rows=params.stream_chunk_size) \
+        if params.save_corpus else None
+    num_train, num_val = 0, 0
+
+    def rows():
+        for chunk in chunks:
+            for text, label in zip(chunk['text'].tolist(), chunk['class'].tolist()):
+                yield text, label
+
+    rows_to_clean, rows_to_write = itertools.tee(rows())
+    cleaned = (prepro.clean(text) for text, _ in rows_to_clean)
+    tokenized = tokenizer.fit_on_texts_batched(cleaned,
+                                               batch_size=params.tokenizer_batch_size,
+                                               num_workers=util.get_num_workers(params))
+    # Reading + cleaning happen lazily inside the tokenizer generator so are included in this stage.
+    tokenized = profiling.iterate('read_clean_tokenize', tokenized, batch_size=params.tokenizer_batch_size)
+
+    with prepro.ShuffledRecordWriter(params.max_tokens, train_record_path) as train_writer, \
+            prepro.ShuffledRecordWriter(params.max_tokens, val_record_path) as val_writer:
+        def write_batch(batch):
+            # Rows are written in batches so the write stage is timed once per batch rather than once per row.
+            batch_train, batch_val = 0, 0
+
+            with profiling.stage('write_records', rows=len(batch)):
+                for tweet in batch:
+                    if corpus_writer is not None:
+                        corpus_writer.add(tweet)
+
+                    if splitter.is_val(tweet['text'], tweet['label']):
+                        val_writer.write_row(tweet)
+                        batch_val += 1
+                    else:
+                        train_writer.write_row(tweet)
+                        sample.add(tweet)
+                        batch_train += 1
+
+            return batch_train, batch_val
+
+        batch = []
+
+        for (text, label), (orig_tokens, modified_tokens, pos_tags) in tqdm(zip(rows_to_write, tokenized)):
+            class_counts[label] += 1
+            if label not in classes:
+                classes[label] = len(classes)
+
+            num_tokens = len(modified_tokens)
+
+            if num_tokens == 0:
+                if corpus_writer is not None:
+                    corpus_writer.add_dropped(text, classes[label])
+                continue
+
+            batch.append({
+                'text': text,
+                'orig_tokens': orig_tokens,
+                'tokens': modified_tokens,
+                'tags': pos_tags,
+                'num_tokens': num_tokens,
+                'label': classes[label],
+            })
+
+            if len(batch) >= params.tokenizer_batch_size:
+                batch_train, batch_val = write_batch(batch)
+                num_train, num_val = num_train + batch_train, num_val + batch_val
+                batch = []
+
+        batch_train, batch_val = write_batch(batch)
+        num_train, num_val = num_train + batch_train, num_val + batch_val
+
+    if corpus_writer is not None:
+        with profiling.stage('save_corpus', rows=num_train + num_val):
+            corpus_writer.save(classes, token_cache_settings(params))
+
+    if print_classes:
+        print(class_counts)
+
+    print('Number of Data Samples:' + str(num_train + num_val))
+    print('Num classes: ' + str(len(classes)))
+
+    meta = {
+        'num_train': num_train,
+        'num_val': num_val,
+    }
+
+    save_processed(params, tokenizer, classes, meta, sample.examples)
+
+
+def process_shard(args):
+    """ Cleans, tokenizes and writes one shard of the data in a worker process.
+        Args:
+            args: Tuple of (texts, labels, train_path, val_path, max_tokens, batch_size, splitter), labels are class
+                  ids and splitter is a HashSplitter.
+        Returns:
+            A dict of the shards tokenizer counters, number of train/val rows, a sample of train rows and any hashtag
+            segmentations made while cleaning, along with correction and segmentation cache hits/misses.
+    """
+    texts, labels, train_path, val_path, max_tokens, batch_size, splitter = args
+    segmentation_cache = prepro.segmentation_cache
+    known_segmentations = set(segmentation_cache.cache.keys())
+    segmentation_hits, segmentation_misses = segmentation_cache.hits, segmentation_cache.misses
+
+    cleaned = [prepro.clean(text) for text in texts]
+    tokenized, counters, correction_stats = toke.fit_chunk((cleaned, True, batch_size, ))
+    tweets = []
+
+    for text, label, (orig_tokens, modified_tokens, pos_tags) in zip(texts, labels, tokenized):
+        num_tokens = len(modified_tokens)
+
+        if num_tokens == 0:
+            continue
+
+        tweet = {
+            'text': text,
+            'orig_tokens': orig_tokens,
+            'tokens': modified_tokens,
+            'tags': pos_tags,
+            'num_tokens': num_tokens,
+            'label': label,
+        }
+
+        tweets.append(tweet)
+
+    train, val = split_tweets(tweets, splitter)
+    del tweets
+    writer = prepro.RecordWriter(max_tokens)
+    writer.write(train_path, train)
+    writer.write(val_path, val)
+
+    return {
+        'counters': counters,
+        'correction_stats': correction_stats,
+        'segmentation_stats': (segmentation_cache.hits - segmentation_hits,
+                               segmentation_cache.misses - segmentation_misses, ),
+        'segmentations': {text: words for text, words in segmentation_cache.cache.items()
+                          if text not in known_segmentations},
+        'num_train': len(train),
+        'num_val': len(val),
+        'examples': get_examples(train),
+    }
+
+
+def process_sharded(params, data, print_classes=True):
+    """ Parallel version of process that splits the rows across a pool of worker processes.
+
+        Each worker cleans, tokenizes and writes its share of the rows into its own train and val .tfrecord shard,
+        returning only its counters. The counters are merged here before the indexes + embedding matrices are built
+        and a manifest listing the shards is saved so util.tf_record_paths returns them.
+
+        Args:
+            params: A dictionary of parameters.
+            data: A DataFrame with class and text columns.
+            print_classes: Whether to print the number of rows per class.
+    """
+    directories = util.get_directories(params)
+    util.make_dirs(directories)
+    # Workers don't send their rows back so no corpus is saved in this mode.
+    remove_corpus(params)
+    num_shards = util.get_num_workers(params)
+    train_paths, val_paths = util.tf_record_shard_paths(params, num_shards)
+
+    if print_classes:
+        print(data['class'].value_counts())
+
+    load_segmentation_cache(params)
+    vocab = load_vocab(params)
+    tokenizer = create_tokenizer(params, vocab)
+
+    classes = data['class'].unique()
+    classes = util.index_from_list(classes, skip_zero=False)
+
+    texts = data['text'].tolist()
+    labels = [classes[label] for label in data['class'].tolist()]
+    # Every shard gets the same splitter, with stratify it's fit on all rows so the split matches the other modes.
+    splitter = create_splitter(params, zip(texts, labels))
+    # Strided partitions keep the shards the same size and mix rows from across the file into each one.
+    shards = [(texts[i::num_shards], labels[i::num_shards], train_paths[i], val_paths[i], params.max_tokens,
+               params.tokenizer_batch_size, splitter, ) for i in range(num_shards)]
+    del texts, labels
+
+    examples = []
+    num_train, num_val = 0, 0
+
+    with profiling.stage('process_shards', rows=len(data)), \
+            multiprocessing.Pool(num_shards, initializer=toke.init_worker, initargs=(tokenizer, )) as pool:
+        for result in tqdm(pool.imap_unordered(process_shard, shards), total=num_shards):
+            tokenizer.merge_chunk([], result['counters'], result['correction_stats'])
+            prepro.segmentation_cache.update(result['segmentations'])
+            prepro.segmentation_cache.hits += result['segmentation_stats'][0]
+            prepro.segmentation_cache.misses += result['segmentation_stats'][1]
+            num_train += result['num_train']
+            num_val += result['num_val']
+            examples += result['examples']
+
+    print('Number of Data Samples:' + str(num_train + num_val))
+    print('Num classes: ' + str(len(classes)))
+
+    util.save_json(util.records_manifest_path(params), {
+        constants.FileNames.TRAIN: [os.path.basename(path) for path in train_paths],
+        constants.FileNames.VAL: [os.path.basename(path) for path in val_paths],
+    })
+
+    meta = {
+        'num_train': num_train,
+        'num_val': num_val,
+        'num_shards': num_shards,
+    }
+
+    save_processed(params, tokenizer, classes, meta, get_examples(examples))
+
+
+def process_from_tokens(params):
+    """ Rebuilds the indexes, embedding matrices and .tfrecord files from the corpus saved by a previous run.
+
+        Only index building and record writing depend on settings such as max_words, min_word_occur, trainable_words
+        or max_tokens, so these can be changed and the data rebuilt without cleaning or tokenizing any rows.
+
+        Args:
+            params: A dictionary of parameters.
+    """
+    directories = util.get_directories(params)
+    util.make_dirs(directories)
+    corpus_path = util.corpus_directory(params)
+
+    if not util.file_exists(os.path.join(corpus_path, constants.FileNames.CORPUS_META)):
+        raise ValueError(constants.ErrorMessages.NO_CORPUS.format(path=corpus_path))
+
+    with profiling.stage('load_corpus'):
+        corpus = prepro.CorpusStore.load(corpus_path)
+
+    if corpus.settings != token_cache_settings(params):
+        print('Warning: The corpus was tokenized with different settings, tokens may differ from a full run.')
+
+    load_segmentation_cache(params)
+    vocab = load_vocab(params)
+    tokenizer = create_tokenizer(params, vocab)
+
+    with profiling.stage('count', rows=len(corpus)):
+        tokenizer.merge_chunk([], corpus.counters(), (0, 0, ))
+
+    with profiling.stage('read_corpus', rows=len(corpus)):
+        tweets = list(corpus)
+
+    # Fit on every row of the original data, including those dropped for having no tokens, as process does.
+    splitter = create_splitter(params, corpus.split_rows() if params.stratify_split else None)
+
+    print('Number of Data Samples:' + str(len(tweets)))
+    train, val = split_and_write(params, tweets, splitter)
+    del tweets
+    print('Num classes: ' + str(len(corpus.classes)))
 
-    examples = get_examples(train)
     meta = {
         'num_train': len(train),
         'num_val': len(val),
-        'num_classes': num_classes,
-        'num_tags': len(tokenizer.tag_index)
     }
 
-    # Save meta information, e.g. number of train/val/classes
-    util.save_json(meta_path, meta)
-    util.save_json(classes_path, classes)
-    # Save a random sample of the data.
-    util.save_json(examples_path, examples)
-    # Save the word index mapping of word:index for both the pre-trained and trainable embeddings.
-    util.save_json(word_index_path, word_index)
-    util.save_json(char_index_path, char_index)
-    util.save_json(trainable_index_path, trainable_index)
-    util.save_json(pos_index_path, tokenizer.tag_index)
-    # Save the trainable embeddings matrix.
-    np.save(trainable_embeddings_path, trainable_matrix)
-    # Save the full embeddings matrix
-    np.save(word_embeddings_path, embedding_matrix)
-    np.save(char_embeddings_path, char_matrix)
+    save_processed(params, tokenizer, corpus.classes, meta, get_examples(train))
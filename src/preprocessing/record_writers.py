@@ -1,5 +1,7 @@
+import os
 import tensorflow as tf
 import random
+from src import profiling
 
 
 class RecordWriter(object):
@@ -42,8 +44,8 @@ class RecordWriter(object):
         return record
 
     def shuffle(self, data):
-        """ Takes a dict input and returns a shuffled list of its values. """
-        shuffled = list(data)
+        """ Shuffles a list in place and returns it, any other iterable is first copied into a list. """
+        shuffled = data if isinstance(data, list) else list(data)
         random.shuffle(shuffled)
         return shuffled
 
@@ -67,3 +69,122 @@ class RecordWriter(object):
 
                 record = self.create_record(data)
                 writer.write(record.SerializeToString())
+
+
+class ShuffledRecordWriter(RecordWriter):
+    def __init__(self, max_tokens, path, num_shards=32, skip_too_long=True):
+        """ Writes rows to a .tfrecord file one at a time while keeping memory bounded.
+
+            Rows can't be shuffled in memory when streaming, so each serialized row is appended to a randomly chosen
+            temporary shard. On close every shard is read back, shuffled and appended to the final file, this gives a
+            full shuffle while only ever holding 1 / num_shards of the rows in memory.
+
+            Args:
+                max_tokens: Maximum number of tokens per row, rows over this will be skipped by default.
+                path: Filepath to write out a .tfrecord file.
+                num_shards: Number of temporary shards used for shuffling.
+                skip_too_long: Boolean flag for whether rows > max_tokens are skipped or included.
+        """
+        super(ShuffledRecordWriter, self).__init__(max_tokens)
+        self.path = path
+        self.skip_too_long = skip_too_long
+        self.shard_paths = ['{}.shuffle-{}'.format(path, i) for i in range(num_shards)]
+        self.shard_writers = [tf.python_io.TFRecordWriter(shard_path) for shard_path in self.shard_paths]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write_row(self, data):
+        """ Serializes a single pre-processed tweet into a random temporary shard. """
+        if data['num_tokens'] > self.max_tokens and self.skip_too_long:
+            return
+
+        record = self.create_record(data)
+        random.choice(self.shard_writers).write(record.SerializeToString())
+
+    def close(self):
+        """ Shuffles each temporary shard into the final .tfrecord file and removes the shards. """
+        for shard_writer in self.shard_writers:
+            shard_writer.close()
+
+        with profiling.stage('shuffle_records'), tf.python_io.TFRecordWriter(self.path) as writer:
+            for shard_path in self.shard_paths:
+                records = self.shuffle(tf.python_io.tf_record_iterator(shard_path))
+
+                for record in records:
+                    writer.write(record)
+
+                os.remove(shard_path)
+
+
+class IndexedRecordWriter(RecordWriter):
+    def __init__(self, max_tokens, vocabs):
+        """ Writes rows with the word, char and tag ids the pipeline lookup tables would give them instead of strings.
+
+            Ids are the positions returned by pipeline.create_lookup_tables, e.g. unknown strings get the last
+            position of their vocab, and chars are split into utf-8 bytes the same as tf.string_split. The chars of
+            every token are stored flattened with the number of chars per token so the pipeline can rebuild the
+            padded [num_tokens, num_chars] matrix without any string ops.
+
+            Args:
+                max_tokens: Maximum number of tokens per row, rows over this will be skipped by default.
+                vocabs: Tuple of the word, char and tag vocabs, lists of strings where position is index.
+        """
+        super(IndexedRecordWriter, self).__init__(max_tokens)
+        word_vocab, char_vocab, tag_vocab = vocabs
+        self.word_index = {word: i for i, word in enumerate(word_vocab)}
+        self.char_index = {char.encode('utf-8'): i for i, char in enumerate(char_vocab)}
+        self.tag_index = {tag: i for i, tag in enumerate(tag_vocab)}
+        self.default_ids = (len(word_vocab) - 1, len(char_vocab) - 1, len(tag_vocab) - 1, )
+        # Every char id is a single byte, cache the id of each byte.
+        self.byte_ids = [self.char_index.get(bytes([byte]), self.default_ids[1]) for byte in range(256)]
+
+    def create_feature_dict(self, data):
+        """ Looks up the ids of each token, char and tag and encodes them as tf.train Feature's. """
+        default_word, _, default_tag = self.default_ids
+        char_ids, char_lengths = [], []
+
+        for token in data['orig_tokens']:
+            encoded = token.encode('utf-8')
+            char_ids.extend([self.byte_ids[byte] for byte in encoded])
+            char_lengths.append(len(encoded))
+
+        features = {
+            'words': self.int_list([self.word_index.get(token, default_word) for token in data['tokens']]),
+            'chars': self.int_list(char_ids),
+            'char_lengths': self.int_list(char_lengths),
+            'tags': self.int_list([self.tag_index.get(tag, default_tag) for tag in data['tags']]),
+            'num_tokens': self.int_list([data['num_tokens']]),
+            'label': self.int_list([data['label']]),
+        }
+
+        return features
+
+    def read_rows(self, path):
+        """ Reads the rows of a .tfrecord file of strings written by RecordWriter, in file order. """
+        for record in tf.python_io.tf_record_iterator(path):
+            feature = tf.train.Example.FromString(record).features.feature
+            yield {
+                'orig_tokens': [m.decode('utf-8') for m in feature['orig_tokens'].bytes_list.value],
+                'tokens': [m.decode('utf-8') for m in feature['tokens'].bytes_list.value],
+                'tags': [m.decode('utf-8') for m in feature['tags'].bytes_list.value],
+                'num_tokens': feature['num_tokens'].int64_list.value[0],
+                'label': feature['label'].int64_list.value[0],
+            }
+
+    def convert(self, path, out_path):
+        """ Converts a .tfrecord file of strings to one of ids, keeping the row order. path may equal out_path.
+            Args:
+                path: Filepath of a .tfrecord file written by RecordWriter.
+                out_path: Filepath to write the indexed .tfrecord file to.
+        """
+        tmp_path = '{}.indexing'.format(out_path)
+
+        with tf.python_io.TFRecordWriter(tmp_path) as writer:
+            for data in self.read_rows(path):
+                writer.write(self.create_record(data).SerializeToString())
+
+        os.replace(tmp_path, out_path)
@@ -0,0 +1,71 @@
+import hashlib
+from array import array
+import numpy as np
+
+HASH_RANGE = 1 << 64
+
+
+class HashSplitter(object):
+    def __init__(self, val_split=0.2, stratify=False, num_buckets=10000):
+        """ Assigns rows to train or val by hashing their text into one of num_buckets buckets.
+
+            The split of a row only depends on its text, so it is the same on every run and machine, needs no memory
+            and can be made independently by streaming or sharded writers. Duplicate texts always land in the same
+            split. With stratify the splitter is first fit on the rows, giving each class a threshold on the full
+            64 bit hash so exactly val_split of the class's rows (rounded, duplicates aside) fall below it. The split
+            is then still a pure function of a rows text + class, whatever order rows are seen in.
+
+            Args:
+                val_split: Fraction of rows to assign to val.
+                stratify: Whether to guarantee every class is split by val_split, requires calling fit.
+                num_buckets: Number of hash buckets, sets the granularity of val_split.
+        """
+        self.val_split = val_split
+        self.stratify = stratify
+        self.num_buckets = num_buckets
+        self.threshold = int(round(val_split * num_buckets))
+        self.class_thresholds = None
+
+    def hash(self, text):
+        """ Returns a 64 bit hash of text, blake2b is used as python's hash() is salted per process. """
+        digest = hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def bucket(self, text):
+        """ Returns the hash bucket of text. """
+        return self.hash(text) % self.num_buckets
+
+    def fit(self, rows):
+        """ Finds the hash threshold of each class for stratify.
+            Args:
+                rows: Iterable of (text, label) tuples, labels must be the same values later passed to is_val.
+        """
+        hashes = {}
+
+        for text, label in rows:
+            if label not in hashes:
+                hashes[label] = array('Q')
+            hashes[label].append(self.hash(text))
+
+        self.class_thresholds = {}
+
+        for label, values in hashes.items():
+            values = np.sort(np.frombuffer(values, dtype=np.uint64))
+            num_val = int(round(len(values) * self.val_split))
+            self.class_thresholds[label] = int(values[num_val]) if num_val < len(values) else HASH_RANGE
+
+    def is_val(self, text, label=None):
+        """ Returns whether a row belongs in the val set.
+            Args:
+                text: The raw text of the row.
+                label: The class of the row, only needed with stratify.
+            Returns:
+                True for val, False for train.
+        """
+        if self.stratify:
+            assert self.class_thresholds is not None, 'HashSplitter.fit must be called before is_val with stratify.'
+            # Classes not seen by fit fall back to an unstratified split on the full hash.
+            threshold = self.class_thresholds.get(label, int(self.val_split * HASH_RANGE))
+            return self.hash(text) < threshold
+
+        return self.bucket(text) < self.threshold
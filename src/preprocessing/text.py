@@ -1,8 +1,7 @@
 import re
 import unicodedata
-from wordsegment import load, segment
-
-load()
+from collections import OrderedDict
+from src import constants, resources, util
 
 FLAGS = re.MULTILINE | re.DOTALL
 whitespace_chars = {' ', '\t', '\n', '\r', '\u200b', '\u200c', '\u200d', '\ufeff', '\u200e'}
@@ -26,11 +25,98 @@ hashtag_regex = re.compile("#\S+")
 hashtag_splitter_regex = re.compile(r'((?<=[a-z])[A-Z]|[A-Z](?=[a-z]))')
 word_split = re.compile(r'[/\-_\\/]')
 
+loleyes = r"[8:=;]"
+eyes = r"[8:=;Xx]"
+nose = r"['`^\-0Oo]?"
+# Smiley rules are order dependent (each \B is evaluated against the output of the previous rule) so they are kept as
+# separate passes, but compiled once rather than rebuilt for every tweet.
+smiley_rules = [
+    (re.compile(r"\B{}{}[)D]+|[(D]+{}{}".format(eyes, nose, nose, eyes), FLAGS), ' -smile- '),
+    (re.compile(r"\B{}{}[pPbB]+".format(loleyes, nose), FLAGS), ' -lolface- '),
+    (re.compile(r"\B{}{}[(?]+|\)+{}{}".format(eyes, nose, nose, eyes), FLAGS), ' -sadface- '),
+    (re.compile(r"\B{}{}[\/\\|l]".format(eyes, nose), FLAGS), ' -neutralface- '),
+    (re.compile(r"\B{}{}[*]".format(eyes, nose), FLAGS), ' -kisses- '),
+    # Replace kisses e.g. xx, xoxoxo
+    (re.compile(r'(\b([Xx][Oo]){1,}\b)|(\b[Xx]{2,}\b)|(\b[Xx]$)'), ' -kisses- '),
+]
+# Every smiley rule needs at least one of these characters to match.
+smiley_chars = re.compile(r'[8:=;Xx]')
+
+
+class SegmentationCache(object):
+    def __init__(self, max_size=100000):
+        """ Bounded LRU cache in front of wordsegment.segment.
+
+            Segmentation is a dynamic programming search over the unigram/bigram tables and costs milliseconds per
+            call, while hashtags are heavily repeated across a corpus. Hits and misses are counted so the cache can be
+            sized, and the contents can be saved to and loaded from a .json file so later runs start warm. The
+            segmentation tables themselves are only loaded on the first miss.
+
+            Args:
+                max_size: Maximum number of hashtag bodies to hold, least recently used entries are evicted first.
+        """
+        self.max_size = max_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def segment(self, text):
+        """ Segments text into a list of words, returning a cached result if we have seen this text before. """
+        if text in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(text)
+            return self.cache[text]
+
+        self.misses += 1
+        words = resources.get(constants.Resources.WORD_SEGMENT).segment(text)
+        self.cache[text] = words
+
+        if len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+        return words
+
+    def resize(self, max_size):
+        """ Changes the maximum size of the cache, evicting the least recently used entries if necessary. """
+        self.max_size = max_size
+        while len(self.cache) > self.max_size:
+            self.cache.popitem(last=False)
+
+    def info(self):
+        """ Returns a dict of cache statistics. """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+            'size': len(self.cache),
+            'max_size': self.max_size,
+        }
+
+    def load(self, path):
+        """ Loads previously saved segmentations from a .json file, does nothing if the file doesn't exist. """
+        if not util.file_exists(path):
+            return
+        self.update(util.load_json(path))
+
+    def update(self, segmentations):
+        """ Adds a dict of hashtag body: words mappings to the cache, e.g. segmentations made in another process. """
+        for text, words in segmentations.items():
+            self.cache[text] = words
+        self.resize(self.max_size)
+
+    def save(self, path):
+        """ Saves the cached segmentations as a .json file. """
+        util.save_json(path, self.cache)
+
+
+segmentation_cache = SegmentationCache()
+
 
 def hashtag(text):
     text = text.group()
     hashtag_body = text[1:]
-    hashtag_body = ' '.join(segment(hashtag_body))
+    hashtag_body = ' '.join(segmentation_cache.segment(hashtag_body))
 
     hashtag_body = hashtag_splitter_regex.sub(r' \1', hashtag_body)
     result = " ".join([" -hashtag- "] + hashtag_body.split(r"(?=[A-Z])") + [" -/hashtag- "])
@@ -44,23 +130,37 @@ def annotate_hashtags(text):
 
 
 def replace_smileys(text):
-    def re_sub(pattern, repl):
-        return re.sub(pattern, repl, text, flags=FLAGS)
+    for pattern, repl in smiley_rules:
+        text = pattern.sub(repl, text)
+    return text
 
-    loleyes = r"[8:=;]"
-    eyes = r"[8:=;Xx]"
-    nose = r"['`^\-0Oo]?"
 
-    text = re_sub(r"\B{}{}[)D]+|[(D]+{}{}".format(eyes, nose, nose, eyes), ' -smile- ')
-    text = re_sub(r"\B{}{}[pPbB]+".format(loleyes, nose), ' -lolface- ')
-    text = re_sub(r"\B{}{}[(?]+|\)+{}{}".format(eyes, nose, nose, eyes), ' -sadface- ')
-    text = re_sub(r"\B{}{}[\/\\|l]".format(eyes, nose), ' -neutralface- ')
-    text = re_sub(r"\B{}{}[*]".format(eyes, nose), ' -kisses- ')
+class NormalizeTable(dict):
+    """ str.translate table for normalize(), maps a codepoint to its normalized replacement.
 
-    # Replace kisses e.g. xx, xoxoxo
-    text = re.sub(r'(\b([Xx][Oo]){1,}\b)|(\b[Xx]{2,}\b)|(\b[Xx]$)', ' -kisses- ', text)
+        Each codepoint is classified with unicodedata the first time it is seen and the result is stored, so after
+        warm up normalizing a string is a single C level str.translate call rather than a Python loop with several
+        category lookups per character. Unchanged characters map to themselves and invalid characters to None.
+    """
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
 
-    return text
+        if is_invalid(char):
+            replacement = None
+        elif is_whitespace(char):
+            replacement = ' '
+        elif is_dash(char):
+            replacement = ' - '
+        elif is_math_symbol(char):
+            replacement = ' {} '.format(char)
+        else:
+            replacement = codepoint
+
+        self[codepoint] = replacement
+        return replacement
+
+
+normalize_table = NormalizeTable()
 
 
 def normalize(text):
@@ -72,25 +172,62 @@ def normalize(text):
         Returns:
             Cleaned string.
     """
-    text = text.strip()
-    text = list(text)
-    # Normalize spaces + remove invalid characters.
-    out_text = []
+    return text.strip().translate(normalize_table)
 
-    for char in text:
-        if is_invalid(char):
-            continue
 
-        if is_whitespace(char):
-            out_text.append(' ')
-        elif is_dash(char):
-            out_text.append(' - ')
-        elif is_math_symbol(char):
-            out_text.append(' {} '.format(char))
-        else:
-            out_text.append(char)
+class TweetCleaner(object):
+    def __init__(self):
+        """ Compiled form of the cleaning rules applied by clean().
+
+            Single character rules (word splitting, spacing before :/$ and backticks) are merged into one
+            str.translate table and every regex is compiled once. Rules whose result depends on the output of a
+            previous rule (paren spacing, smileys) stay as separate passes so output is identical to the chained
+            version, but are skipped entirely when the text cannot match them.
+        """
+        self.char_table = str.maketrans({
+            '/': ' ',
+            '-': ' ',
+            '_': ' ',
+            '\\': ' ',
+            ':': ' :',
+            '$': ' $',
+            '`': ' `',
+        })
+
+    def clean(self, text):
+        """ Cleans the given text, see clean() for details.
+            Args:
+                text: String text to be cleaned.
+            Returns:
+                Cleaned string.
+        """
+        text = text.translate(self.char_table)
+
+        if '..' in text:
+            text = elipsiss.sub(r' \1 ', text)
+
+        if '(' in text:
+            text = space_before_paren.sub(r'\1 \2', text)
 
-    return ''.join(out_text)
+        if ')' in text:
+            text = space_after_paren.sub(r'\1 \2', text)
+
+        text = emoji_regex.sub('', text)
+        text = normalize(text)
+
+        if '#' in text:
+            text = hashtag_regex.sub(hashtag, text.replace('#', ' #'))
+
+        if smiley_chars.search(text):
+            text = replace_smileys(text)
+
+        text = double_punct.sub(r'\1 \2', text)
+        text = multi_spaces.sub(' ', text)
+        text = text.strip()
+        return text
+
+
+default_cleaner = TweetCleaner()
 
 
 def clean(text):
@@ -103,20 +240,7 @@ def clean(text):
         Returns:
             Cleaned string.
     """
-    text = word_split.sub(' ', text)
-    text = space_before.sub(r' \1', text)
-    text = elipsiss.sub(r' \1 ', text)
-    text = apostrophe_like.sub(r' \1', text)
-    text = space_before_paren.sub(r'\1 \2', text)
-    text = space_after_paren.sub(r'\1 \2', text)
-    text = emoji_regex.sub('', text)
-    text = normalize(text)
-    text = annotate_hashtags(text)
-    text = replace_smileys(text)
-    text = double_punct.sub(r'\1 \2', text)
-    text = multi_spaces.sub(' ', text)
-    text = text.strip()
-    return text
+    return default_cleaner.clean(text)
 
 
 def is_whitespace(char):
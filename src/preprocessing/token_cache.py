@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from src import constants, util
+
+
+def content_hash(text):
+    """ Returns a short, stable hex digest of a raw row of text. """
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=12).hexdigest()
+
+
+class TokenCache(object):
+    def __init__(self, path, settings, max_loaded_chunks=4):
+        """ Persistent cache of tokenized rows keyed by a hash of the raw text, used to preprocess incrementally.
+
+            Rows are saved in chunks as they are tokenized, every completed chunk is recorded in a manifest along
+            with the cleaner/tokenizer settings that produced it. A later run only cleans + tokenizes rows whose
+            hash isn't cached under the same settings, so adding rows to a dataset only costs the new rows and a run
+            that is interrupted resumes from its last completed chunk. Chunks made with different settings are
+            deleted on load.
+
+            Only an index of which chunk holds each row is kept in memory, chunks are read when one of their rows
+            is requested and the max_loaded_chunks most recently used are kept. Chunks are written in the order
+            rows are read, so a run over the same or an appended dataset reads each chunk about once.
+
+            Args:
+                path: Directory to store the manifest and chunks in.
+                settings: A json serializable dict of the settings that determine how a row is tokenized.
+                max_loaded_chunks: Number of chunks of rows held in memory at a time.
+        """
+        self.path = path
+        self.manifest_path = os.path.join(path, constants.FileNames.TOKEN_CACHE_MANIFEST)
+        # Round trip through json so lists/tuples compare equal to the saved settings.
+        self.settings = json.loads(json.dumps(settings))
+        self.max_loaded_chunks = max_loaded_chunks
+        self.chunks = []
+        self.index = {}
+        self.loaded = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, keys=None):
+        """ Indexes every chunk saved with matching settings, removing any that were made with other settings.
+
+            Chunks are read one at a time. With keys, rows whose hash isn't in keys (their text was removed from or
+            changed in the dataset) and duplicates of rows already indexed are pruned, chunks left without rows are
+            deleted and the rest are rewritten with only the rows still in use.
+
+            Args:
+                keys: Set of the row hashes of the current dataset, None to keep every row.
+        """
+        if not util.file_exists(self.manifest_path):
+            return
+
+        for chunk in util.load_json(self.manifest_path):
+            chunk_path = os.path.join(self.path, chunk['name'])
+
+            if chunk['settings'] != self.settings:
+                if util.file_exists(chunk_path):
+                    os.remove(chunk_path)
+                continue
+
+            if not util.file_exists(chunk_path):
+                continue
+
+            rows = util.load_json(chunk_path)
+
+            if keys is not None:
+                kept = [row for row in rows if row[0] in keys and row[0] not in self.index]
+
+                if len(kept) == 0:
+                    os.remove(chunk_path)
+                    continue
+
+                if len(kept) < len(rows):
+                    self.write_chunk(chunk_path, kept)
+                    chunk = dict(chunk, num_rows=len(kept))
+
+                rows = kept
+
+            for row in rows:
+                self.index[row[0]] = chunk['name']
+
+            self.chunks.append(chunk)
+
+        self.save_manifest()
+
+    def read_chunk(self, name):
+        """ Returns a dict of row hash: (original tokens, tokens, tags) for a chunk, reading it if not loaded. """
+        if name in self.loaded:
+            self.loaded.move_to_end(name)
+            return self.loaded[name]
+
+        rows = {key: (orig_tokens, tokens, tags, )
+                for key, orig_tokens, tokens, tags in util.load_json(os.path.join(self.path, name))}
+        self.loaded[name] = rows
+
+        if len(self.loaded) > self.max_loaded_chunks:
+            self.loaded.popitem(last=False)
+
+        return rows
+
+    def get(self, key):
+        """ Returns the cached (original tokens, tokens, tags) for a row hash or None if it hasn't been seen. """
+        name = self.index.get(key)
+
+        if name is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return self.read_chunk(name)[key]
+
+    def write_chunk(self, chunk_path, rows):
+        # Write to a temporary file first so a crash never leaves a partial chunk in the manifest.
+        util.save_json(chunk_path + '.tmp', rows)
+        os.replace(chunk_path + '.tmp', chunk_path)
+
+    def add_chunk(self, keys, rows):
+        """ Saves a completed chunk of tokenized rows and checkpoints it in the manifest.
+            Args:
+                keys: List of row hashes.
+                rows: List of (original tokens, tokens, tags) tuples in the same order as keys.
+        """
+        util.make_dirs(self.path)
+        name = constants.FileNames.TOKEN_CACHE_CHUNK.format(chunk=self.next_chunk_id())
+        self.write_chunk(os.path.join(self.path, name), [[key] + list(row) for key, row in zip(keys, rows)])
+
+        for key in keys:
+            self.index[key] = name
+
+        self.chunks.append({'name': name, 'num_rows': len(keys), 'settings': self.settings})
+        self.save_manifest()
+
+    def next_chunk_id(self):
+        used = {chunk['name'] for chunk in self.chunks}
+        chunk_id = len(self.chunks)
+        while constants.FileNames.TOKEN_CACHE_CHUNK.format(chunk=chunk_id) in used:
+            chunk_id += 1
+        return chunk_id
+
+    def save_manifest(self):
+        util.make_dirs(self.path)
+        util.save_json(self.manifest_path + '.tmp', self.chunks)
+        os.replace(self.manifest_path + '.tmp', self.manifest_path)
+
+    def info(self):
+        """ Returns a dict of cache statistics. """
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total > 0 else 0.0,
+            'size': len(self.index),
+            'num_chunks': len(self.chunks),
+        }
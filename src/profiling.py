@@ -0,0 +1,148 @@
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from src import constants, util
+
+try:
+    import resource
+except ImportError:
+    # The resource module is unix only, peak RSS isn't reported elsewhere.
+    resource = None
+
+
+def peak_rss_mb():
+    """ Returns the peak resident set size of this process in MB, or None if it can't be measured. """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on linux and bytes on macOS.
+    return max_rss / (1024 * 1024) if os.uname().sysname == 'Darwin' else max_rss / 1024
+
+
+class StageProfiler(object):
+    def __init__(self, enabled=False, cprofile_dir=None):
+        """ Records wall time, CPU time, throughput and peak memory for named stages of a pipeline.
+
+            Stages are timed with the stage context manager, or with iterate for work that happens lazily inside a
+            generator, repeated entries of a stage are accumulated. Peak memory is the process's peak RSS when the
+            stage ends, the stage whose peak_rss_increase_mb is largest set the peak. When disabled every stage is a
+            no-op so instrumentation can stay in place. Stages shouldn't be nested when running cProfile.
+
+            Args:
+                enabled: Whether stages are recorded.
+                cprofile_dir: Directory to dump a cProfile .prof file per stage to, None to not run cProfile.
+        """
+        self.enabled = enabled
+        self.cprofile_dir = cprofile_dir
+        self.stages = {}
+        self.profiles = {}
+
+    def reset(self, enabled=False, cprofile_dir=None):
+        """ Clears every recorded stage and sets whether stages are recorded. """
+        self.__init__(enabled, cprofile_dir)
+
+    def start(self, name):
+        if name not in self.stages:
+            self.stages[name] = {
+                'calls': 0,
+                'wall_time': 0.0,
+                'cpu_time': 0.0,
+                'rows': 0,
+                'peak_rss_increase_mb': 0.0,
+            }
+
+        if self.cprofile_dir is not None:
+            import cProfile
+            self.profiles.setdefault(name, cProfile.Profile()).enable()
+
+        return time.perf_counter(), time.process_time(), peak_rss_mb()
+
+    def stop(self, name, started, rows=0):
+        wall_start, cpu_start, rss_start = started
+        wall_time = time.perf_counter() - wall_start
+        cpu_time = time.process_time() - cpu_start
+
+        if self.cprofile_dir is not None:
+            self.profiles[name].disable()
+
+        record = self.stages[name]
+        record['calls'] += 1
+        record['wall_time'] += wall_time
+        record['cpu_time'] += cpu_time
+        record['rows'] += rows
+        record['rows_per_sec'] = record['rows'] / record['wall_time'] if record['wall_time'] > 0 else 0.0
+
+        rss_end = peak_rss_mb()
+        if rss_end is not None:
+            record['peak_rss_mb'] = rss_end
+            record['peak_rss_increase_mb'] += rss_end - rss_start
+
+    @contextmanager
+    def stage(self, name, rows=0):
+        """ Context manager timing the enclosed block as the stage name.
+            Args:
+                name: Name of the stage.
+                rows: Number of rows processed by the block, used for rows/sec.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        started = self.start(name)
+        try:
+            yield
+        finally:
+            self.stop(name, started, rows)
+
+    def iterate(self, name, iterable, batch_size=1):
+        """ Wraps an iterable so only the time spent producing each item is recorded as the stage name, each item is
+            counted as a row.
+            Args:
+                name: Name of the stage.
+                iterable: Iterable to time.
+                batch_size: Number of items produced per timed call, items are buffered so the clocks are read once
+                    per batch rather than once per item.
+        """
+        if not self.enabled:
+            for item in iterable:
+                yield item
+            return
+
+        iterator = iter(iterable)
+
+        while True:
+            started = self.start(name)
+            batch = list(itertools.islice(iterator, batch_size))
+            self.stop(name, started, rows=len(batch))
+
+            if not batch:
+                return
+
+            for item in batch:
+                yield item
+
+    def report(self):
+        """ Returns a dict of the recorded stages and the peak RSS of the whole run. """
+        return {
+            'stages': self.stages,
+            'peak_rss_mb': peak_rss_mb(),
+        }
+
+    def save(self, path):
+        """ Saves the report as a .json file and dumps any cProfile stats next to it. """
+        util.save_json(path, self.report(), indent=2)
+
+        for name, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(self.cprofile_dir, constants.FileNames.CPROFILE.format(stage=name)))
+
+
+profiler = StageProfiler()
+
+
+def stage(name, rows=0):
+    return profiler.stage(name, rows)
+
+
+def iterate(name, iterable, batch_size=1):
+    return profiler.iterate(name, iterable, batch_size)
@@ -0,0 +1,69 @@
+import time
+from src import constants
+
+
+class ResourceRegistry(object):
+    def __init__(self):
+        """ Registry of expensive, shared resources such as spaCy pipelines and word segmentation tables.
+
+            Resources are registered with a loader function and are only loaded the first time they are requested,
+            after which every caller shares the same instance. This keeps modes that never touch a resource (e.g.
+            train never needs spaCy) from paying for it at startup.
+        """
+        self.loaders = {}
+        self.resources = {}
+        self.load_times = {}
+
+    def register(self, name, loader):
+        """ Registers a loader for a named resource.
+            Args:
+                name: String key for the resource.
+                loader: Function taking no arguments that returns the loaded resource.
+        """
+        self.loaders[name] = loader
+
+    def get(self, name):
+        """ Returns the named resource, loading it if this is the first request. """
+        if name not in self.resources:
+            if name not in self.loaders:
+                raise ValueError(constants.ErrorMessages.UNKNOWN_RESOURCE.format(name=name))
+
+            start = time.time()
+            self.resources[name] = self.loaders[name]()
+            self.load_times[name] = time.time() - start
+
+        return self.resources[name]
+
+    def is_loaded(self, name):
+        """ Tests whether or not the named resource has been loaded. """
+        return name in self.resources
+
+
+def load_word_segment():
+    """ Loads the unigram/bigram tables used by wordsegment.segment. """
+    import wordsegment
+    wordsegment.load()
+    return wordsegment
+
+
+def load_spacy_en():
+    """ Loads the small english spaCy pipeline without the dependency parser. """
+    import spacy
+    return spacy.load('en_core_web_sm', disable=['parser'])
+
+
+def load_spacy_en_tokenizer():
+    """ Loads a blank english spaCy pipeline, this only runs the rule based tokenizer and its exceptions. """
+    from spacy.lang.en import English
+    return English()
+
+
+registry = ResourceRegistry()
+registry.register(constants.Resources.WORD_SEGMENT, load_word_segment)
+registry.register(constants.Resources.SPACY_EN, load_spacy_en)
+registry.register(constants.Resources.SPACY_EN_TOKENIZER, load_spacy_en_tokenizer)
+
+
+def get(name):
+    """ Returns the named resource from the default registry. """
+    return registry.get(name)
@@ -1,7 +1,11 @@
-import string
-from collections import Counter
-import spacy
+import functools
+import itertools
+import multiprocessing
 import re
+import string
+from collections import Counter, deque
+from src import constants, resources
+from src.vocab import FrozenVocab
 
 default_punct = set(string.punctuation)
 
@@ -15,12 +19,21 @@ REGEX_LOOKUP = {
 url_regex = re.compile(REGEX_LOOKUP['URL'])
 email_regex = re.compile(REGEX_LOOKUP['EMAIL'])
 numbers_regex = re.compile(REGEX_LOOKUP['NUMBERS'])
+# Single pass classifier for numbers, urls and emails, alternatives are tried in the same order as the separate
+# regexes.
+token_class_regex = re.compile('(?P<number>{})|(?P<url>{})|(?P<email>{})'.format(
+    REGEX_LOOKUP['NUMBERS'], REGEX_LOOKUP['URL'], REGEX_LOOKUP['EMAIL']))
+token_class_replacements = {
+    'number': '-number-',
+    'url': '-url-',
+    'email': '-email-',
+}
 
 
 class Tokenizer(object):
     def __init__(self, lower=False, filters=default_punct, max_words=25000, max_chars=2500, min_word_occurrence=-1,
                  min_char_occurrence=-1, vocab=None, word_index=None, char_index=None, oov_token='<oov>',
-                 trainable_words=None):
+                 trainable_words=None, backend=constants.TokenizerBackends.SPACY, correction_cache_size=100000):
         """
             Constructs a Tokenizer Object, this is a wrapper around Spacy which tracks word/character usage as well
             as handling trainable words, unknown word tokens and filters.
@@ -32,18 +45,22 @@ class Tokenizer(object):
                 max_chars: Maximum number of chars to include in the char_index.
                 min_word_occurrence: How many times a word must occur to be included in the word_index.
                 min_char_occurrence: How many times a char must occur to be included in the char_index.
-                vocab: A list of strings that are considered our vocab e.g. list of words with embeddings.
+                vocab: A list of strings that are considered our vocab e.g. list of words with embeddings, a
+                       FrozenVocab is used as is rather than copied into a set.
                 word_index: A dict of word: index mappings.
                 char_index: A dict of char: index mappings.
                 oov_token: Token to replace out of vocabulary words/chars with.
                 trainable_words: A list of words which we want to have trainable embeddings.
+                backend: Either spacy to tokenize + tag with en_core_web_sm or rules to only run spaCy's rule based
+                         tokenizer and emit a constant tag for every token.
+                correction_cache_size: Max number of (token, lemma) pairs to memoize error corrections for.
         """
         self.word_counter = Counter()
         self.char_counter = Counter()
         self.tag_counter = Counter()
-        self.vocab = set(vocab if vocab else [])
+        self.vocab = as_vocab(vocab if vocab else [])
+        # Trainable words are always considered part of the vocab, see in_vocab.
         self.trainable_words = set(trainable_words if trainable_words else [])
-        self.vocab = self.vocab | self.trainable_words
 
         self.word_index = word_index if word_index else {}
         self.char_index = char_index if char_index else {}
@@ -57,7 +74,18 @@ class Tokenizer(object):
         self.just_fit = False
         self.given_vocab = vocab is not None
 
-        self.nlp = spacy.load('en_core_web_sm', disable=['parser'])
+        if backend == constants.TokenizerBackends.SPACY:
+            self.nlp_resource = constants.Resources.SPACY_EN
+        elif backend == constants.TokenizerBackends.RULES:
+            self.nlp_resource = constants.Resources.SPACY_EN_TOKENIZER
+        else:
+            raise ValueError(constants.ErrorMessages.INVALID_TOKENIZER_BACKEND.format(backend=backend))
+
+        self.backend = backend
+        self.use_tags = backend == constants.TokenizerBackends.SPACY
+        self.nlp = resources.get(self.nlp_resource)
+        self.correction_cache_size = correction_cache_size
+        self.init_correction_cache()
         self.tag_index = {key: i for i, key in enumerate(self.nlp.tokenizer.vocab.morphology.tag_map.keys())}
 
         if not isinstance(filters, set) and filters is not None:
@@ -67,6 +95,63 @@ class Tokenizer(object):
 
         self.init()
 
+    def __getstate__(self):
+        """ The spaCy pipeline is not pickled, worker processes load (and share) their own copy. """
+        state = self.__dict__.copy()
+        del state['nlp']
+        del state['cached_correct']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.nlp = resources.get(self.nlp_resource)
+        self.init_correction_cache()
+
+    def init_correction_cache(self):
+        """ (Re)creates the bounded memo in front of correct, needed whenever the vocab changes. """
+        self.cached_correct = functools.lru_cache(maxsize=self.correction_cache_size)(self.correct)
+        self.worker_correction_hits = 0
+        self.worker_correction_misses = 0
+
+    def correct(self, text, lemma):
+        """ Finds a replacement for an out of vocab token.
+
+            Numbers, urls and emails are replaced with a token that is optionally trainable, otherwise we generate a
+            short list of candidate words and return the first one that is in the vocab.
+
+            Args:
+                text: Token text that is not in the vocab.
+                lemma: The tokens lemma.
+            returns:
+                The corrected token or None if no correction was found.
+        """
+        match = token_class_regex.match(text)
+        if match is not None:
+            return token_class_replacements[match.lastgroup]
+
+        for word in (text.lower(), text.capitalize(), text.lower().capitalize(), text.upper(), lemma):
+            if self.in_vocab(word):
+                return word
+
+        return None
+
+    def in_vocab(self, word):
+        """ Tests whether word is in the vocab or is a trainable word. """
+        return word in self.vocab or word in self.trainable_words
+
+    def correction_cache_info(self):
+        """ Returns a dict of correction cache statistics, including hits/misses from worker processes. """
+        info = self.cached_correct.cache_info()
+        hits = info.hits + self.worker_correction_hits
+        misses = info.misses + self.worker_correction_misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses > 0 else 0.0,
+            'size': info.currsize,
+            'max_size': info.maxsize,
+        }
+
     def tokenize(self, text, error_correct=True):
         """ Splits a text or list of text into its constituent words.
             Args:
@@ -79,34 +164,46 @@ class Tokenizer(object):
         if self.lower:
             text = text.lower()
 
+        return self.process_doc(self.nlp(text), error_correct)
+
+    def tokenize_pipe(self, texts, error_correct=True, batch_size=1000):
+        """ Tokenizes an iterable of texts, streaming them through spaCy's nlp.pipe in batches.
+            Args:
+                texts: Iterable of untokenized strings.
+                error_correct: See tokenize.
+                batch_size: Number of texts spaCy processes per batch.
+            returns:
+                A generator of (original tokens, corrected tokens, tags) tuples in the same order as texts.
+        """
+        if self.lower:
+            texts = (text.lower() for text in texts)
+
+        for doc in self.nlp.pipe(texts, batch_size=batch_size):
+            yield self.process_doc(doc, error_correct)
+
+    def process_doc(self, doc, error_correct=True):
+        """ Extracts original tokens, error corrected tokens and tags from a spaCy Doc.
+            Args:
+                doc: A spaCy Doc.
+                error_correct: See tokenize.
+            returns:
+                Three lists, a list of original tokens, a list of corrected tokens and a list of tags.
+        """
         original_tokens = []
         modified_tokens = []
         pos_tags = []
 
-        for token in self.nlp(text):
+        for token in doc:
             text = token.text
-            tag = token.tag_
+            tag = token.tag_ if self.use_tags else constants.TokenizerBackends.NO_TAG
             token_corrected = False
 
-            if self.given_vocab and error_correct and text not in self.vocab:
-                # Replace numbers, urls and emails with a token that is optionally trainable.
-                if numbers_regex.match(text):
-                    text = '-number-'
-                    token_corrected = True
-                elif url_regex.match(text):
-                    text = '-url-'
-                    token_corrected = True
-                elif email_regex.match(text):
-                    text = '-email-'
+            if self.given_vocab and error_correct and not self.in_vocab(text):
+                corrected = self.cached_correct(text, token.lemma_)
+
+                if corrected is not None:
+                    text = corrected
                     token_corrected = True
-                else:
-                    # We generate a short list of candidate words and replace the
-                    # original text if any of them are in the vocab.
-                    for word in (text.lower(), text.capitalize(), text.lower().capitalize(), text.upper(), token.lemma_):
-                        if word in self.vocab:
-                            text = word
-                            token_corrected = True
-                            break
 
             if text not in self.filters and len(text) > 0:
                 if token_corrected:
@@ -122,6 +219,15 @@ class Tokenizer(object):
 
         return original_tokens, modified_tokens, pos_tags
 
+    def count(self, modified_tokens, pos_tags):
+        """ Adds the tokens, their characters and tags to the word, char and tag counters. """
+        for token, tag in zip(modified_tokens, pos_tags):
+            self.word_counter[token] += 1
+            self.tag_counter[tag] += 1
+
+            for char in list(token):
+                self.char_counter[char] += 1
+
     def fit_on_texts(self, texts, error_correct=True):
         """ Counts word/character occurrence.
             Args:
@@ -137,17 +243,64 @@ class Tokenizer(object):
 
         for text in texts:
             tokens, modified_tokens, pos_tags = self.tokenize(text, error_correct)
+            self.count(modified_tokens, pos_tags)
+            tokenized.append((tokens, modified_tokens, pos_tags, ))
 
-            for token, tag in zip(modified_tokens, pos_tags):
-                self.word_counter[token] += 1
-                self.tag_counter[tag] += 1
+        self.just_fit = True
+        return tokenized
 
-                for char in list(token):
-                    self.char_counter[char] += 1
+    def fit_on_texts_batched(self, texts, error_correct=True, batch_size=1000, num_workers=1, chunk_size=10000):
+        """ Counts word/character occurrence, batching texts through nlp.pipe and optionally spreading the work over
+            multiple processes.
 
-            tokenized.append((tokens, modified_tokens, pos_tags, ))
+            Each worker process tokenizes chunks of texts with its own copy of the tokenizer and counters, the
+            counters are then merged into this tokenizer. Results are identical to calling fit_on_texts on each text.
+            Texts are consumed lazily and only a few chunks per worker are in flight at once, so texts can be a
+            generator over a dataset larger than memory.
 
+            Args:
+                texts: Iterable of untokenized strings.
+                error_correct: See fit_on_texts.
+                batch_size: Number of texts spaCy processes per batch.
+                num_workers: Number of worker processes, 1 tokenizes in this process.
+                chunk_size: Number of texts sent to a worker at a time.
+            returns:
+                A generator of (original tokens, corrected tokens, tags) tuples in the same order as texts.
+        """
+        # Set up front, callers commonly zip the rows with their own data and never exhaust this generator.
         self.just_fit = True
+
+        if num_workers <= 1:
+            for tokens, modified_tokens, pos_tags in self.tokenize_pipe(texts, error_correct, batch_size):
+                self.count(modified_tokens, pos_tags)
+                yield tokens, modified_tokens, pos_tags
+        else:
+            texts = iter(texts)
+            pending = deque()
+
+            with multiprocessing.Pool(num_workers, initializer=init_worker, initargs=(self, )) as pool:
+                while True:
+                    chunk = list(itertools.islice(texts, chunk_size))
+
+                    if len(chunk) > 0:
+                        pending.append(pool.apply_async(fit_chunk, ((chunk, error_correct, batch_size, ), )))
+
+                    # Only wait on the oldest chunk once enough work is queued to keep every worker busy.
+                    if len(pending) > 0 and (len(pending) >= 2 * num_workers or len(chunk) == 0):
+                        for row in self.merge_chunk(*pending.popleft().get()):
+                            yield row
+                    elif len(chunk) == 0:
+                        break
+
+    def merge_chunk(self, tokenized, counters, correction_stats):
+        """ Merges the counters and stats returned by fit_chunk into this tokenizer and returns the tokenized rows. """
+        self.just_fit = True
+        word_counter, char_counter, tag_counter = counters
+        self.word_counter.update(word_counter)
+        self.char_counter.update(char_counter)
+        self.tag_counter.update(tag_counter)
+        self.worker_correction_hits += correction_stats[0]
+        self.worker_correction_misses += correction_stats[1]
         return tokenized
 
     def update_indexes(self):
@@ -157,13 +310,17 @@ class Tokenizer(object):
             handling the word and char index creation. We create the word indexes as normal, but instead of assigning
             trainable word ids based on how often it occurs they are always assigned to the highest Id's. For details
             on why refer to docstrings in src/models/embedding_layer.
+
+            Assigned ids are tracked in a set so every uniqueness check is O(1) rather than a scan of the index.
         """
         print('Total Unique Words: %d' % len(self.word_counter))
         sorted_words = self.word_counter.most_common(self.max_words)
         sorted_chars = self.char_counter.most_common(self.max_chars)
+        excluded_words = self.filters | self.trainable_words
 
+        # Vocab membership is the most expensive check so it goes last.
         word_index = [word for (word, count) in sorted_words if count > self.min_word_occurrence and
-                      word in self.vocab and word not in self.filters and word not in self.trainable_words]
+                      word not in excluded_words and word in self.vocab]
 
         print('Words in vocab: %d' % len(word_index))
 
@@ -173,20 +330,23 @@ class Tokenizer(object):
         # Put all the Ids in a continues range from 1 to len(vocab), this is necessary to keep indices in sync.
         word_index = {word: i for i, word in enumerate(word_index, start=1)}
         char_index = {char: i for i, char in enumerate(char_index, start=1)}
+        word_ids = set(word_index.values())
+        char_ids = set(char_index.values())
 
         # Add any trainable words to the end of the index (Refer to src/models/embedding_layer for a full reason why)
         vocab_size = len(word_index)
         for i, word in enumerate(self.trainable_words, start=1):
-            assert (vocab_size + i) not in word_index.values()
+            assert (vocab_size + i) not in word_ids
             word_index[word] = vocab_size + i
+            word_ids.add(vocab_size + i)
 
         # Add OOV token to the word + char index (So we always have an OOV token in the vocab).
         if self.oov_token not in word_index:
-            assert len(word_index) + 1 not in word_index.values()
+            assert len(word_index) + 1 not in word_ids
             word_index[self.oov_token] = len(word_index) + 1  # Add OOV as the last character
 
         if self.oov_token not in char_index:
-            assert len(char_index) + 1 not in char_index.values()
+            assert len(char_index) + 1 not in char_ids
             char_index[self.oov_token] = len(char_index) + 1  # Add OOV as the last character
 
         self.word_index = word_index
@@ -202,9 +362,10 @@ class Tokenizer(object):
             Args:
                 vocab: List of strings for words that are in the vocab (e.g. words with embeddings).
         """
-        self.vocab = set(vocab)
+        self.vocab = as_vocab(vocab)
         self.given_vocab = True
         self.just_fit = True
+        self.init_correction_cache()
 
     def init(self):
         """ Initialises the vocab, word and char indices if they have not been set or need updating. """
@@ -213,3 +374,45 @@ class Tokenizer(object):
             self.update_vocab()
             self.update_indexes()
             self.just_fit = False
+
+
+def as_vocab(vocab):
+    """ Returns a FrozenVocab unchanged, otherwise copies the given words into a set. """
+    if isinstance(vocab, FrozenVocab):
+        return vocab
+    return set(vocab)
+
+
+# Tokenizer used by worker processes in Tokenizer.fit_on_texts_batched, set once per process by init_worker.
+worker_tokenizer = None
+
+
+def init_worker(tokenizer):
+    """ Pool initializer, stores this processes copy of the tokenizer. """
+    global worker_tokenizer
+    worker_tokenizer = tokenizer
+
+
+def fit_chunk(args):
+    """ Tokenizes a chunk of texts in a worker process.
+        Args:
+            args: Tuple of (texts, error_correct, batch_size).
+        Returns:
+            The tokenized rows, the word, char and tag counters and the correction cache hits/misses for just this
+            chunk.
+    """
+    texts, error_correct, batch_size = args
+    worker_tokenizer.word_counter = Counter()
+    worker_tokenizer.char_counter = Counter()
+    worker_tokenizer.tag_counter = Counter()
+    tokenized = []
+    start_info = worker_tokenizer.cached_correct.cache_info()
+
+    for tokens, modified_tokens, pos_tags in worker_tokenizer.tokenize_pipe(texts, error_correct, batch_size):
+        worker_tokenizer.count(modified_tokens, pos_tags)
+        tokenized.append((tokens, modified_tokens, pos_tags, ))
+
+    end_info = worker_tokenizer.cached_correct.cache_info()
+    counters = (worker_tokenizer.word_counter, worker_tokenizer.char_counter, worker_tokenizer.tag_counter, )
+    correction_stats = (end_info.hits - start_info.hits, end_info.misses - start_info.misses, )
+    return tokenized, counters, correction_stats
@@ -167,15 +167,23 @@ def construct_train_op(loss, learn_rate=0.001, warmup_scheme='inverse_exp', warm
     return train_op
 
 
-def get_saver(ema_decay=0.0, ema_vars_only=False):
+def get_saver(ema_decay=0.0, ema_vars_only=False, exclude=None):
     """
         Args:
             ema_decay: Ema decay value.
             ema_vars_only: Boolean flag for restoring EMA variables only.
+            exclude: Optional list of variables to leave out of the saver, these keep their initialized values on
+                     restore, e.g. the frozen word embeddings when serving a pruned export.
         Returns:
             A tuple of input tensors.
     """
+    exclude = set(exclude) if exclude is not None else set()
+
     if 0.0 < ema_decay < 1.0 and ema_vars_only:
         variable_averages = tf.train.ExponentialMovingAverage(0.)
-        return tf.train.Saver(variable_averages.variables_to_restore())
+        var_list = {name: var for name, var in variable_averages.variables_to_restore().items() if var not in exclude}
+        return tf.train.Saver(var_list)
+
+    if len(exclude) > 0:
+        return tf.train.Saver([var for var in tf.global_variables() if var not in exclude])
     return tf.train.Saver()
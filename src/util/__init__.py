@@ -1,7 +1,13 @@
 from .cli import yes_no_prompt
 from .util import index_from_list, load_json, save_json, namespace_json, \
     make_dirs, concat_load_tsvs, load_sem_eval_2017_txt, load_vocab_files, load_multiple_jsons, file_exists,\
-    directory_is_empty, directory_exists, save_config, load_config, unpack_dict
-from .embeddings import generate_matrix, load_numpy_files, load_embedding_file, read_embeddings_file
+    directory_is_empty, directory_exists, save_config, load_config, unpack_dict, get_num_workers, \
+    get_tokenizer_backend, index_to_array, get_embedding_dtype
+from .embeddings import generate_matrix, load_numpy_files, load_embedding_file, read_embeddings_file, \
+    load_embedding_index, convert_embeddings_file, EmbeddingIndex, read_embeddings_vocab, stream_embedding_matrix, \
+    quantize_embeddings, dequantize_embeddings, is_quantized
 from .filepaths import raw_data_paths, index_paths, embedding_paths, save_paths, \
-    get_directories, tf_record_paths, examples_path, meta_path, classes_path, processed_data_directory, config_path
+    get_directories, tf_record_paths, examples_path, meta_path, classes_path, processed_data_directory, config_path, \
+    segmentation_cache_path, vocab_paths, tf_record_shard_paths, records_manifest_path, \
+    token_cache_directory, profile_path, corpus_directory, export_directory, export_paths, \
+    pipeline_cache_directory, tsv_cache_directory
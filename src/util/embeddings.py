@@ -1,7 +1,12 @@
+import multiprocessing
+import os
+import shutil
 import numpy as np
+from src import constants
+from src.vocab import FrozenVocab
 
 
-def generate_matrix(index, embedding_dimensions=300, skip_zero=True, scale=0.1):
+def generate_matrix(index, embedding_dimensions=300, skip_zero=True, scale=0.1, dtype=np.float32):
     """ Generates a matrix of shape [len(index), embedding_dimension] and initializes it with a
         random normal distribution.
 
@@ -10,6 +15,7 @@ def generate_matrix(index, embedding_dimensions=300, skip_zero=True, scale=0.1):
             embedding_dimensions: Dimension of the embeddings.
             skip_zero: Whether or not 0 represents a padding character.
             scale: Standard Deviation of the normal distribution.
+            dtype: Dtype of the matrix.
         Returns:
             Embedding index with any trainable words set to all zero.
     """
@@ -18,7 +24,7 @@ def generate_matrix(index, embedding_dimensions=300, skip_zero=True, scale=0.1):
     else:
         rows = len(index)
 
-    matrix = np.random.normal(scale=scale, size=(rows, embedding_dimensions))
+    matrix = np.random.normal(scale=scale, size=(rows, embedding_dimensions)).astype(dtype)
 
     if skip_zero:
         matrix[0] = np.zeros(embedding_dimensions)
@@ -26,26 +32,60 @@ def generate_matrix(index, embedding_dimensions=300, skip_zero=True, scale=0.1):
     return matrix
 
 
-def zero_out_trainables(embedding_index, word_index, embedding_dimensions, trainable_words):
-    """ Function that zeroes out trainable words in the embedding index.
+def quantized_dtype(embedding_dimensions):
+    """ Structured dtype of a row of an int8 quantized embedding matrix, a float32 scale and the int8 values. """
+    return np.dtype([('scale', np.float32), ('values', np.int8, (embedding_dimensions, ))])
+
+
+def is_quantized(matrix):
+    """ Tests whether matrix is an int8 quantized embedding matrix. """
+    return matrix.dtype.names == ('scale', 'values', )
+
+
+def quantize_embeddings(matrix):
+    """ Quantizes an embedding matrix to int8 with a float32 scale per row.
+
+        Each row is scaled so its largest absolute value maps to 127. The matrix is a structured array so it can be
+        saved as a regular .npy file, its header describing the dtype of the values and their scales.
+
+        Args:
+            matrix: A float matrix of shape [num_words + 1, embedding_dimension].
+        Returns:
+            A structured array of num_words + 1 (scale, values) rows.
+    """
+    scales = np.abs(matrix).max(axis=1).astype(np.float32) / 127.0
+    quantized = np.zeros(len(matrix), dtype=quantized_dtype(matrix.shape[1]))
+    quantized['scale'] = scales
+    # All-zero rows keep a scale of zero, divide them by one instead.
+    quantized['values'] = np.round(matrix / np.where(scales > 0, scales, 1.0)[:, None])
+    return quantized
+
+
+def dequantize_embeddings(matrix, dtype=np.float32):
+    """ Returns a float matrix of a quantized, float16 or float32 embedding matrix. """
+    if is_quantized(matrix):
+        return matrix['values'].astype(dtype) * matrix['scale'][:, None].astype(dtype)
+    return matrix.astype(dtype)
+
+
+def zero_out_trainables(embedding_matrix, word_index, trainable_words):
+    """ Function that zeroes out trainable words in the embedding matrix.
 
         For trainable embeddings we only use the embedding from the trainable matrix, to ensure that
-        there is no pre-trained influence on these words we zero out the embedding in the pre-trained embedding
-        index.
+        there is no pre-trained influence on these words we zero out their rows of the pre-trained embedding
+        matrix, in place and in a single operation.
 
         Args:
-            embedding_index: A dict of word to embedding mappings.
+            embedding_matrix: A numpy matrix of shape [num_words + 1, embedding_dimension].
             word_index: A dict of word to index mappings.
-            embedding_dimensions: Dimension of the embeddings.
             trainable_words: A list of string keys for trainable words.
         Returns:
-            Embedding index with any trainable words set to all zero.
+            Embedding matrix with the rows of any trainable words set to all zero.
     """
     for word in trainable_words:
         assert word in word_index
-        # Zero out the vector for this word in the pre-trained index.
-        embedding_index[word] = np.zeros((embedding_dimensions, ), dtype=np.float32)
-    return embedding_index
+    embedding_matrix[[word_index[word] for word in trainable_words]] = 0
+    return embedding_matrix
 
 
 def read_embeddings_file(path):
@@ -56,35 +96,360 @@ def read_embeddings_file(path):
             Embedding index mapping words to an n dimensional vector.
     """
     embedding_index = {}
+    for word, values in iter_embedding_lines(path):
+        embedding_index[word] = np.asarray(values.split(' '), dtype=np.float32)
+    return embedding_index
+
+
+def split_line(line, embedding_dimensions):
+    """ Splits a line of a GloVe/FastText file into its word and the string of its vector values.
+
+        Everything but the last embedding_dimensions fields is the word, as GloVe 840B contains words with spaces.
+        Counting spaces first means only the rare lines with these words need a full split.
+
+        Args:
+            line: A line of the embeddings file with any trailing whitespace stripped.
+            embedding_dimensions: Dimension of the embeddings.
+        Returns:
+            A tuple of word, vector values.
+    """
+    if line.count(' ') == embedding_dimensions:
+        word, values = line.split(' ', 1)
+        return word, values
+    values = line.split(' ')
+    return ' '.join(values[:-embedding_dimensions]), ' '.join(values[-embedding_dimensions:])
+
+
+def iter_embedding_lines(path):
+    """ Iterates over the (word, vector values) of each line of a GloVe/FastText file, skipping a FastText header. """
+    embedding_dimensions = None
     with open(path, 'r', encoding='utf-8') as f:
         for i, line in enumerate(f):
-            values = line.strip().split(' ')
+            line = line.rstrip()
             # First line is num words + vector size when using fast text, we skip this.
-            if i == 0 and len(values) == 2:
+            if i == 0 and line.count(' ') == 1:
                 print('Detected FastText vector format.')
                 continue
-            word = values[0]
-            coefs = np.asarray(values[1:], dtype=np.float32)
-            embedding_index[word] = coefs
+            if embedding_dimensions is None:
+                embedding_dimensions = line.count(' ')
+            yield split_line(line, embedding_dimensions)
 
-    return embedding_index
+
+def read_embeddings_vocab(path, use_cache=True, num_workers=1):
+    """ First phase of loading embeddings, reads just the words with an embedding.
+
+        With use_cache the vocab of the binary cache is memory mapped, otherwise only the word column of the text
+        file is scanned, in both cases no vectors are held in memory.
+
+        Args:
+            path: Path to the embeddings file.
+            use_cache: Whether to use (and if necessary build) the binary cache.
+            num_workers: Number of processes to build the cache with.
+        Returns:
+            A FrozenVocab of words with an embedding.
+    """
+    if use_cache:
+        return load_embedding_index(path, num_workers=num_workers).vocab
+    return FrozenVocab.build([word for word, _ in iter_embedding_lines(path)])
+
+
+def embedding_cache_path(path):
+    """ Path of the directory holding the binary cache of a GloVe/FastText text file. """
+    return constants.FileNames.EMBEDDING_CACHE.format(path=path)
+
+
+def embedding_cache_is_valid(path):
+    """ Tests whether the binary cache of an embeddings file exists and is newer than the text file. """
+    vectors_path = os.path.join(embedding_cache_path(path), constants.FileNames.EMBEDDING_VECTORS)
+    return os.path.exists(vectors_path) and os.path.getmtime(vectors_path) >= os.path.getmtime(path)
+
+
+def embedding_file_chunks(path, chunk_bytes=1 << 26):
+    """ Splits a GloVe/FastText file into byte ranges of roughly chunk_bytes that start and end on a line boundary.
+        Args:
+            path: Path to the embeddings file.
+            chunk_bytes: Approximate size of each range.
+        Returns:
+            The embedding dimensions and a list of (start, length) tuples covering every line after any header.
+    """
+    size = os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        first_line = f.readline()
+        fields = first_line.rstrip().split(b' ')
+        # First line is num words + vector size when using fast text, we skip this.
+        if len(fields) == 2:
+            print('Detected FastText vector format.')
+            start = len(first_line)
+            embedding_dimensions = int(fields[1])
+        else:
+            start = 0
+            embedding_dimensions = len(fields) - 1
+
+        chunks = []
+        while start < size:
+            f.seek(min(start + chunk_bytes, size))
+            f.readline()
+            end = min(f.tell(), size)
+            chunks.append((start, end - start, ))
+            start = end
+
+    return embedding_dimensions, chunks
+
+
+def read_chunk(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return f.read(length)
 
 
-def create_embedding_matrix(embedding_index, word_index, embedding_dimensions):
+def count_chunk_lines(args):
+    """ Counts the lines within a byte range of a file. """
+    data = read_chunk(*args)
+    return data.count(b'\n') + (0 if data.endswith(b'\n') else 1)
+
+
+def parse_chunk(args):
+    """ Parses a byte range of a GloVe/FastText file into rows of a shared .npy matrix.
+
+        The words are split off each line and the vector values of the whole range are converted to floats in a single
+        vectorized call.
+
+        Args:
+            args: A tuple of path, start, length, vectors path, first row, embedding dimensions.
+        Returns:
+            A list of the words in the range, in row order.
+    """
+    path, start, length, vectors_path, row, embedding_dimensions = args
+    data = read_chunk(path, start, length).rstrip(b'\n')
+    lines = data.split(b'\n')
+
+    # Most ranges have no words containing spaces or trailing whitespace, so every line splits at its first space
+    # and only the words need decoding.
+    if data.count(b' ') == len(lines) * embedding_dimensions and b'\r' not in data:
+        words, values = zip(*[line.split(b' ', 1) for line in lines])
+        words = [word.decode('utf-8') for word in words]
+        values = b' '.join(values)
+    else:
+        words, values = zip(*[split_line(line.decode('utf-8').rstrip(), embedding_dimensions) for line in lines])
+        values = ' '.join(values)
+
+    try:
+        chunk = np.array(values.split(), dtype=np.float32)
+    except ValueError:
+        chunk = None
+
+    if chunk is None or len(chunk) != len(lines) * embedding_dimensions:
+        raise ValueError('Expected {} dimensional vectors in {} between bytes {} and {}.'.format(
+            embedding_dimensions, path, start, start + length))
+
+    vectors = np.load(vectors_path, mmap_mode='r+')
+    vectors[row:row + len(lines)] = chunk.reshape((len(lines), embedding_dimensions))
+    vectors.flush()
+    return list(words)
+
+
+def parse_embeddings_file(path, vectors_path, num_workers=1, chunk_bytes=1 << 26):
+    """ Parses a GloVe/FastText file in parallel into a float32 .npy matrix with a row per line.
+
+        The file is split into newline aligned byte ranges, the lines in each range are counted and a matrix with
+        a row for every line is preallocated on disk. Ranges are then parsed by a pool of processes that each write
+        their rows straight into the memory mapped matrix, so nothing but the words passes between processes.
+
+        Args:
+            path: Path to the embeddings file.
+            vectors_path: Path to save the .npy matrix of vectors to.
+            num_workers: Number of processes to parse with.
+            chunk_bytes: Approximate size of the byte range parsed by each task.
+        Returns:
+            A list of the word on each row, duplicated words appear once per occurrence.
+    """
+    embedding_dimensions, chunks = embedding_file_chunks(path, chunk_bytes)
+    pool = multiprocessing.Pool(num_workers) if num_workers > 1 else None
+    map_fn = pool.imap if pool is not None else map
+
+    try:
+        num_lines = list(map_fn(count_chunk_lines, [(path, start, length) for start, length in chunks]))
+        rows = np.cumsum([0] + num_lines)
+        vectors = np.lib.format.open_memmap(vectors_path, mode='w+', dtype=np.float32,
+                                            shape=(int(rows[-1]), embedding_dimensions))
+        del vectors
+
+        words = []
+        tasks = [(path, start, length, vectors_path, int(row), embedding_dimensions)
+                 for (start, length), row in zip(chunks, rows)]
+        for chunk_words in map_fn(parse_chunk, tasks):
+            words.extend(chunk_words)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return words
+
+
+def convert_embeddings_file(path, num_workers=1):
+    """ One-time conversion of a GloVe/FastText text file into a binary cache, a contiguous float32 .npy matrix of
+        vectors and a FrozenVocab mapping each word to its row.
+
+        Vectors are parsed in parallel straight into a memory mapped matrix so memory stays flat. As with
+        read_embeddings_file the last vector seen for a duplicated word is kept.
+
+        Args:
+            path: Path to the embeddings file.
+            num_workers: Number of processes to parse the file with.
+        Returns:
+            Path to the cache directory.
+    """
+    cache_path = embedding_cache_path(path)
+    tmp_path = cache_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    vectors_path = os.path.join(tmp_path, constants.FileNames.EMBEDDING_VECTORS)
+    words = parse_embeddings_file(path, vectors_path, num_workers=num_workers)
+    # Each word keeps the position it was first seen at and the row it was last seen at.
+    rows = {word: row for row, word in enumerate(words)}
+
+    # Duplicated words leave rows that need removing from the matrix.
+    if len(rows) < len(words):
+        keep = np.fromiter(rows.values(), dtype=np.int64, count=len(rows))
+        vectors = np.load(vectors_path, mmap_mode='r')
+        trimmed = np.lib.format.open_memmap(vectors_path + '.trimmed.npy', mode='w+', dtype=np.float32,
+                                            shape=(len(keep), vectors.shape[1]))
+        for i in range(0, len(keep), 100000):
+            trimmed[i:i + 100000] = vectors[keep[i:i + 100000]]
+        trimmed.flush()
+        del vectors, trimmed
+        os.replace(vectors_path + '.trimmed.npy', vectors_path)
+
+    FrozenVocab.build(rows.keys()).save(tmp_path)
+    shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(tmp_path, cache_path)
+    return cache_path
+
+
+class EmbeddingIndex(object):
+    def __init__(self, vocab, vectors):
+        """ Read-only word: vector mapping over a FrozenVocab and a float32 matrix with a row per word.
+
+            Used in place of the dict returned by read_embeddings_file, implementing the parts of the dict interface
+            used by the embedding helpers. The matrix is normally memory mapped from the binary cache so only the
+            rows that are looked up are read from disk. Vectors assigned to words (e.g. zeroing out trainable words)
+            are held in a small dict in front of the matrix rather than written to it.
+
+            Args:
+                vocab: A FrozenVocab, the id of each word is its row in vectors.
+                vectors: A float32 matrix of shape [len(vocab), embedding_dimensions].
+        """
+        self.vocab = vocab
+        self.vectors = vectors
+        self.overrides = {}
+
+    @staticmethod
+    def load(path, mmap=True):
+        """ Loads the binary cache written by convert_embeddings_file.
+            Args:
+                path: Cache directory.
+                mmap: Whether to memory map the vectors + vocab rather than reading them into memory.
+            Returns:
+                An EmbeddingIndex.
+        """
+        vectors = np.load(os.path.join(path, constants.FileNames.EMBEDDING_VECTORS), mmap_mode='r' if mmap else None)
+        return EmbeddingIndex(FrozenVocab.load(path, mmap=mmap), vectors)
+
+    def get(self, word, default=None):
+        if word in self.overrides:
+            return self.overrides[word]
+        row = self.vocab.get(word)
+        if row is None:
+            return default
+        return self.vectors[row]
+
+    def keys(self):
+        for word in self.vocab:
+            yield word
+        for word in self.overrides:
+            if word not in self.vocab:
+                yield word
+
+    def __getitem__(self, word):
+        vector = self.get(word)
+        if vector is None:
+            raise KeyError(word)
+        return vector
+
+    def __setitem__(self, word, vector):
+        self.overrides[word] = vector
+
+    def __contains__(self, word):
+        return word in self.overrides or word in self.vocab
+
+    def __len__(self):
+        return len(self.vocab) + len([word for word in self.overrides if word not in self.vocab])
+
+
+def load_embedding_index(path, use_cache=True, num_workers=1):
+    """ Loads the embeddings in a GloVe/FastText text file, via its binary cache when use_cache is set.
+
+        The cache is built on first use and rebuilt whenever the text file is newer than it.
+
+        Args:
+            path: Path to the embeddings file.
+            use_cache: Whether to use (and if necessary build) the binary cache.
+            num_workers: Number of processes to build the cache with.
+        Returns:
+            An EmbeddingIndex when using the cache, otherwise a dict mapping words to vectors.
+    """
+    if not use_cache:
+        return read_embeddings_file(path)
+
+    if not embedding_cache_is_valid(path):
+        print('Building binary embeddings cache, this only happens once per embeddings file...')
+        convert_embeddings_file(path, num_workers=num_workers)
+
+    return EmbeddingIndex.load(embedding_cache_path(path))
+
+
+def check_indexes(word_index, num_rows):
+    """ Raises a ValueError if any index in word_index doesn't fit in an embedding matrix with num_rows rows. """
+    for word, index in word_index.items():
+        if index > num_rows:
+            raise ValueError('Index larger than embedding matrix for {}'.format(word))
+
+
+def create_embedding_matrix(embedding_index, word_index, embedding_dimensions, dtype=np.float32):
     """ Converts the embedding index into an embedding matrix.
+
+        Given an EmbeddingIndex the vectors are copied in with a single gather from the rows of its vectors matrix,
+        a dict is copied one vector at a time.
+
         Args:
-            embedding_index: Path to the embeddings file.
+            embedding_index: A dict of word to embedding mappings or an EmbeddingIndex.
             word_index: A dict of word: index mappings
             embedding_dimensions: Dimension of the output embeddings.
+            dtype: Dtype of the output embeddings.
         Returns:
             A numpy matrix of shape [num_words + 1, embedding_dimension].
     """
-    embedding_matrix = np.zeros((len(word_index) + 1, embedding_dimensions))
+    embedding_matrix = np.zeros((len(word_index) + 1, embedding_dimensions), dtype=dtype)
+    check_indexes(word_index, len(embedding_matrix))
 
-    for word, index in word_index.items():
-        if index > len(embedding_matrix):
-            raise ValueError('Index larger than embedding matrix for {}'.format(word))
+    if isinstance(embedding_index, EmbeddingIndex):
+        if embedding_index.vectors.shape[1] != embedding_dimensions:
+            raise ValueError('Embeddings have {} dimensions, expected {}.'.format(embedding_index.vectors.shape[1],
+                                                                                  embedding_dimensions))
+        vocab, overrides = embedding_index.vocab, embedding_index.overrides
+        indexes = np.fromiter(word_index.values(), dtype=np.int64, count=len(word_index))
+        rows = np.fromiter((-1 if word in overrides else vocab.get(word, -1) for word in word_index),
+                           dtype=np.int64, count=len(word_index))
+        found = rows >= 0
+        # Gathering in row order reads a memory mapped matrix sequentially.
+        order = np.argsort(rows[found])
+        embedding_matrix[indexes[found][order]] = embedding_index.vectors[rows[found][order]]
+        embedding_index = overrides
 
+    for word, index in word_index.items():
         embedding_vector = embedding_index.get(word)
         if embedding_vector is not None:
             # words not found in embedding index will be all-zeros.
@@ -94,26 +459,69 @@ def create_embedding_matrix(embedding_index, word_index, embedding_dimensions):
     return embedding_matrix
 
 
-def load_embedding_file(path, word_index, embedding_dimensions=300, trainable_embeddings=[], embedding_index=None):
+def stream_embedding_matrix(path, word_index, embedding_dimensions=300, trainable_embeddings=[], use_cache=True,
+                            dtype=np.float32):
+    """ Second phase of loading embeddings, fills a preallocated embedding matrix with only the vectors of the words
+        in word_index.
+
+        With use_cache the rows are gathered from the memory mapped binary cache, otherwise the text file is
+        streamed and only the lines for words in word_index are converted to floats. Peak memory is the size of the
+        returned matrix. Words without a vector and trainable words are left as all-zeros.
+
+        Args:
+            path: A string path to a GLoVe/FastText formatted embedding file.
+            word_index: A dict mapping of word: index
+            embedding_dimensions: The dimension of the embeddings.
+            trainable_embeddings: A list of words which are trainable. (e.g. OOV)
+            use_cache: Whether to use (and if necessary build) the binary cache.
+            dtype: Dtype of the output embeddings.
+        Returns:
+            A numpy matrix of shape [num_words + 1, embedding_dimension].
+    """
+    if use_cache:
+        embedding_matrix = create_embedding_matrix(load_embedding_index(path), word_index, embedding_dimensions, dtype)
+        return zero_out_trainables(embedding_matrix, word_index, trainable_embeddings)
+
+    embedding_matrix = np.zeros((len(word_index) + 1, embedding_dimensions), dtype=dtype)
+    check_indexes(word_index, len(embedding_matrix))
+
+    for word, values in iter_embedding_lines(path):
+        i = word_index.get(word)
+        if i is not None:
+            embedding_vector = np.asarray(values.split(' '), dtype=np.float32)
+            assert len(embedding_vector) == embedding_dimensions
+            embedding_matrix[i] = embedding_vector
+
+    return zero_out_trainables(embedding_matrix, word_index, trainable_embeddings)
+
+
+def load_embedding_file(path, word_index, embedding_dimensions=300, trainable_embeddings=[], embedding_index=None,
+                        use_cache=True, dtype=np.float32):
     """ Function for reading embedding matrices saved with numpy.
         Args:
             path: A string path to a GLoVe/FastText formatted embedding file.
             word_index: A dict mapping of word: index
             embedding_dimensions: The dimension of the embeddings.
             trainable_embeddings: A list of words which are trainable. (e.g. OOV)
-            embedding_index: A pre-loaded dict of word: vector mapping.
+            embedding_index: A pre-loaded dict of word: vector mapping or an EmbeddingIndex.
+            use_cache: Whether to read the embeddings file through its binary cache if no index is given.
+            dtype: Dtype of the output embeddings, float32, float16 or int8 for a quantized matrix.
         Returns:
             A list of embedding matrices (In order of paths)
     """
-    # Read the given embeddings file if its not given.
-    embedding_index = embedding_index if embedding_index is not None else read_embeddings_file(path)
+    quantize = np.dtype(dtype) == np.int8
+    dtype = np.float32 if quantize else dtype
 
-    if len(trainable_embeddings) > 0:
-        embedding_index = zero_out_trainables(embedding_index, word_index,
-                                              embedding_dimensions, trainable_embeddings)
-
-    embedding_matrix = create_embedding_matrix(embedding_index, word_index, embedding_dimensions)
+    # Stream only the vectors we need from the embeddings file if an index isn't given.
+    if embedding_index is None:
+        embedding_matrix = stream_embedding_matrix(path, word_index, embedding_dimensions, trainable_embeddings,
+                                                   use_cache, dtype)
+    else:
+        embedding_matrix = create_embedding_matrix(embedding_index, word_index, embedding_dimensions, dtype)
+        embedding_matrix = zero_out_trainables(embedding_matrix, word_index, trainable_embeddings)
 
+    if quantize:
+        return quantize_embeddings(embedding_matrix)
     return embedding_matrix
 
 
@@ -1,3 +1,4 @@
+import json
 import os
 from src import constants
 
@@ -75,6 +76,23 @@ def index_paths(params):
     return paths
 
 
+def vocab_paths(params):
+    """ Generates paths to dense vocab arrays, one per index file.
+        Args:
+            params: A dictionary of parameters.
+        returns:
+            String paths for loading word, trainable, character and tag vocab arrays.
+    """
+    processed_dir = processed_data_directory(params)
+
+    paths = []
+
+    for embed_type in constants.EmbeddingTypes.as_list():
+        paths += [os.path.join(processed_dir, constants.FileNames.VOCAB.format(embedding_type=embed_type))]
+
+    return paths
+
+
 def embedding_paths(params):
     """ Generates paths to saved embedding files.
         Args:
@@ -104,14 +122,33 @@ def save_paths(params):
     return model_path, logs_path
 
 
+def pipeline_cache_directory(params):
+    model_dir, _ = save_paths(params)
+    return os.path.join(model_dir, constants.DirNames.PIPELINE_CACHE)
+
+
 def tf_record_paths(params):
     """ Generates a paths to .tfrecord files for train, dev and test.
+
+        If the data was preprocessed into shards the manifest written alongside them is read and a list of shard
+        paths is returned for each split instead, both forms are accepted by tf.data.TFRecordDataset.
+
         Args:
             params: A dictionary of parameters.
         returns:
-            A string path to .tfrecord file.
+            A string path or list of string paths to .tfrecord files for train and val.
     """
     processed_dir = processed_data_directory(params)
+    manifest_path = records_manifest_path(params)
+
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        paths = (
+            [os.path.join(processed_dir, name) for name in manifest[constants.FileNames.TRAIN]],
+            [os.path.join(processed_dir, name) for name in manifest[constants.FileNames.VAL]],
+        )
+        return paths
 
     paths = (
         os.path.join(processed_dir, constants.FileNames.TF_RECORD.format(name=constants.FileNames.TRAIN)),
@@ -121,6 +158,32 @@ def tf_record_paths(params):
     return paths
 
 
+def tf_record_shard_paths(params, num_shards):
+    """ Generates paths to num_shards .tfrecord shards for both train and val.
+        Args:
+            params: A dictionary of parameters.
+            num_shards: Number of shards per split.
+        returns:
+            A list of string paths for the train shards and a list for the val shards.
+    """
+    processed_dir = processed_data_directory(params)
+    paths = []
+
+    for name in [constants.FileNames.TRAIN, constants.FileNames.VAL]:
+        paths.append([
+            os.path.join(processed_dir, constants.FileNames.TF_RECORD_SHARD.format(name=name, shard=i,
+                                                                                   num_shards=num_shards))
+            for i in range(num_shards)
+        ])
+
+    return paths
+
+
+def records_manifest_path(params):
+    processed_dir = processed_data_directory(params)
+    return os.path.join(processed_dir, constants.FileNames.RECORDS_MANIFEST)
+
+
 def examples_path(params):
     processed_dir = processed_data_directory(params)
     return os.path.join(processed_dir, constants.FileNames.EXAMPLES)
@@ -136,6 +199,53 @@ def classes_path(params):
     return os.path.join(processed_dir, constants.FileNames.CLASSES)
 
 
+def corpus_directory(params):
+    processed_dir = processed_data_directory(params)
+    return os.path.join(processed_dir, constants.DirNames.CORPUS)
+
+
+def export_directory(params):
+    processed_dir = processed_data_directory(params)
+    return os.path.join(processed_dir, constants.DirNames.EXPORT)
+
+
+def export_paths(params):
+    """ Generates paths to the files of a serving export.
+        Args:
+            params: A dictionary of parameters.
+        returns:
+            String paths for the pruned word index, word vocab array, word embeddings and the export report.
+    """
+    export_dir = export_directory(params)
+    word = constants.EmbeddingTypes.WORD
+    return (
+        os.path.join(export_dir, constants.FileNames.INDEX.format(embedding_type=word)),
+        os.path.join(export_dir, constants.FileNames.VOCAB.format(embedding_type=word)),
+        os.path.join(export_dir, constants.FileNames.EMBEDDINGS.format(embedding_type=word)),
+        os.path.join(export_dir, constants.FileNames.EXPORT_REPORT),
+    )
+
+
+def profile_path(params):
+    processed_dir = processed_data_directory(params)
+    return os.path.join(processed_dir, constants.FileNames.PROFILE)
+
+
+def segmentation_cache_path(params):
+    processed_dir = processed_data_directory(params)
+    return os.path.join(processed_dir, constants.FileNames.SEGMENTATION_CACHE)
+
+
+def token_cache_directory(params):
+    processed_dir = processed_data_directory(params)
+    return os.path.join(processed_dir, constants.DirNames.TOKEN_CACHE)
+
+
+def tsv_cache_directory(params):
+    processed_dir = processed_data_directory(params)
+    return os.path.join(processed_dir, constants.DirNames.CACHE)
+
+
 def config_path(params):
     """ Generates a path to a .json file containing parameters used for a train run. """
     model_path, _ = save_paths(params)
@@ -1,9 +1,11 @@
+import hashlib
 import json
 import glob
 import os
 from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor
 from types import SimpleNamespace
-import pandas as pd
+import numpy as np
 from tqdm import tqdm
 from src import constants, util
 
@@ -141,20 +143,50 @@ def make_dirs(directories):
             os.makedirs(directory)
 
 
-def load_vocab_files(paths):
+def index_to_array(index):
+    """ Converts a dict of word: id into a dense array of words ordered by id.
+        Args:
+            index: A dict mapping strings to a contiguous range of integer ids.
+        Returns:
+            A numpy string array where position i holds the word with the i-th smallest id.
+    """
+    if len(index) == 0:
+        return np.array([], dtype=str)
+
+    min_id = min(index.values())
+    words = [None] * len(index)
+
+    for word, i in index.items():
+        assert words[i - min_id] is None, 'Index ids must be unique and contiguous.'
+        words[i - min_id] = word
+
+    return np.array(words, dtype=str)
+
+
+def load_vocab_files(paths, array_paths=None):
     """ Loads a .json index as a list of words where each words position is its index.
         Args:
             paths: Iterable of string paths or string path pointing to .json word index file.
+            array_paths: Optional paths to dense .npy vocab arrays saved alongside each index, these are used in
+                         place of sorting the .json index when they exist.
         Returns:
             A list of strings.
     """
     if isinstance(paths, str):
         paths = [paths]
 
+    if array_paths is None:
+        array_paths = [None] * len(paths)
+    elif isinstance(array_paths, str):
+        array_paths = [array_paths]
+
     vocabs = []
-    for path in paths:
-        index = load_json(path)
-        vocabs.append(sorted(index, key=index.get))
+    for path, array_path in zip(paths, array_paths):
+        if array_path is not None and file_exists(array_path):
+            vocabs.append(np.load(array_path).tolist())
+        else:
+            index = load_json(path)
+            vocabs.append(sorted(index, key=index.get))
     return vocabs
 
 
@@ -185,6 +217,7 @@ def load_sem_eval_2017_txt(path, save_path=None):
     :param save_path: An optional file path to save the correctly formatted TSV data to.
     :return: True/False: Whether we successfully save the file.
     """
+    import pandas as pd
     df = pd.read_csv(path, names=['id', 'class', 'text', 'bl'], sep='\t', index_col=0)
     df = df.drop(columns=['bl'])
 
@@ -194,7 +227,95 @@ def load_sem_eval_2017_txt(path, save_path=None):
     return df
 
 
-def concat_load_tsvs(data_dir, save_path=None):
+def read_tsv(path):
+    """ Reads a Sem Eval .tsv file of id, class, text rows. """
+    import pandas as pd
+    return pd.read_csv(path, names=['id', 'class', 'text'], sep='\t', encoding='utf-8')
+
+
+def decode_escapes(texts):
+    """ Decodes literal \\uXXXX escapes in a list of strings, same as text.encode('utf-8').decode('raw_unicode_escape')
+        for each string.
+
+        The strings are joined on a null character so the codec runs once over the whole list rather than once per
+        string, the null character can't be part of or end an escape sequence so strings can't affect each other. If
+        a string contains the separator (or an escape that decodes to it) we fall back to decoding one at a time.
+
+        Args:
+            texts: List of strings.
+        Returns:
+            List of decoded strings.
+    """
+    separator = '\x00'
+    joined = separator.join(texts)
+
+    if joined.count(separator) == len(texts) - 1:
+        decoded = joined.encode('utf-8').decode('raw_unicode_escape').split(separator)
+        if len(decoded) == len(texts):
+            return decoded
+
+    return [text.encode('utf-8').decode('raw_unicode_escape') for text in texts]
+
+
+def tsv_cache_path(cache_dir, paths):
+    """ Generates a path to the cached copy of a set of .tsv files, keyed by the name, size and mtime of each file so
+        any change to the inputs gives a new path.
+    """
+    stats = []
+    for path in sorted(paths):
+        stat = os.stat(path)
+        stats.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+
+    key = hashlib.sha1(json.dumps(stats).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, constants.FileNames.TSV_CACHE.format(key=key))
+
+
+def save_frame_arrays(path, frame):
+    """ Saves the index + columns of a DataFrame as numpy arrays in a .npz file. String columns are stored as their
+        concatenated UTF-8 bytes and an array of offsets so the file can be loaded without pickle.
+        Args:
+            path: Path to the .npz file.
+            frame: A DataFrame with a named index.
+    """
+    names = [frame.index.name] + list(frame.columns)
+    arrays = {'names': np.array(names)}
+
+    for name, values in zip(names, [frame.index] + [frame[column] for column in frame.columns]):
+        values = np.asarray(values)
+        if values.dtype == object:
+            encoded = [value.encode('utf-8') for value in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(value) for value in encoded], out=offsets[1:])
+            arrays[name + '_blob'] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+            arrays[name + '_offsets'] = offsets
+        else:
+            arrays[name] = values
+
+    # Written to a temporary file first so an interrupted save never leaves a partial cache behind.
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load_frame_arrays(path):
+    """ Loads a DataFrame saved by save_frame_arrays. """
+    import pandas as pd
+    columns = {}
+
+    with np.load(path) as arrays:
+        names = arrays['names'].tolist()
+        for name in names:
+            if name in arrays:
+                columns[name] = arrays[name]
+            else:
+                data, offsets = arrays[name + '_blob'].tobytes(), arrays[name + '_offsets']
+                columns[name] = [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+    return pd.DataFrame(columns, columns=names).set_index(names[0])
+
+
+def concat_load_tsvs(data_dir, save_path=None, cache_dir=None):
     """
     Loads a series of TSV's to form one complete data set, this is performed as the 'full' sem eval dataset
     is spread over multiple years of challenges. Therefore we supplement the 2017 data with the previous years
@@ -202,24 +323,38 @@ def concat_load_tsvs(data_dir, save_path=None):
 
     - Implementation comments
     * The reason for using TSV rather than CSV is because all the previous years Sem Eval stuff is TSV files.
+    * The files are read in parallel and concatenated once, the combined data set is cached as a .npz of numpy arrays
+      in cache_dir so later runs skip parsing entirely until one of the files changes.
 
     :param data_dir:
     :param save_path:
+    :param cache_dir: Directory to read/write the cached copy of the combined data set, None to not cache.
     :return:
     """
-    full_data_set = pd.DataFrame()
+    paths = glob.glob(data_dir + "/*.tsv")
+    cache_path = tsv_cache_path(cache_dir, paths) if cache_dir is not None else None
 
-    for counter, file in enumerate(glob.glob(data_dir + "/*.tsv")):
+    if cache_path is not None and file_exists(cache_path):
+        full_data_set = load_frame_arrays(cache_path)
+    else:
+        import pandas as pd
         # Read the tsvs generated from the previous years script https://github.com/seirasto/twitter_download
         # and the pre-downloaded version from the 2017 txt file formatted as a CSV.
-        curr_file = pd.read_csv(file, names=['id', 'class', 'text'], sep='\t', encoding='utf-8')
-        full_data_set = full_data_set.append(curr_file)
+        with ThreadPoolExecutor(max_workers=max(len(paths), 1)) as executor:
+            full_data_set = pd.concat(list(executor.map(read_tsv, paths)))
+
+        full_data_set = full_data_set.set_index('id')
+        full_data_set = full_data_set.drop_duplicates('text')
 
-    full_data_set = full_data_set.set_index('id')
-    full_data_set = full_data_set.drop_duplicates('text')
+        decoded = pd.Series(decode_escapes(full_data_set['text'].tolist()))
+        full_data_set['text'] = decoded.str.strip().values
 
-    full_data_set['text'] = full_data_set['text'].apply(lambda x: x.encode('utf-8').decode('raw_unicode_escape'))
-    full_data_set['text'] = full_data_set['text'].apply(lambda x: x.strip())
+        if cache_path is not None:
+            make_dirs(cache_dir)
+            # Only keep the cache for the current version of the files.
+            for old_cache_path in glob.glob(os.path.join(cache_dir, constants.FileNames.TSV_CACHE.format(key='*'))):
+                os.remove(old_cache_path)
+            save_frame_arrays(cache_path, full_data_set)
 
     if save_path:
         full_data_set.to_csv(save_path, sep='\t', header=False)
@@ -227,6 +362,33 @@ def concat_load_tsvs(data_dir, save_path=None):
     return full_data_set
 
 
+def get_num_workers(params):
+    """ Calculates the number of preprocessing worker processes, if no number given returns the CPU count. """
+    num_workers = params.preprocess_workers
+    if num_workers < 0:
+        num_workers = os.cpu_count()
+    return num_workers
+
+
+def get_tokenizer_backend(params):
+    """ Resolves the auto tokenizer backend, POS tagging is skipped unless the model uses the tags. """
+    backend = params.tokenizer_backend.lower().strip()
+    if backend == constants.TokenizerBackends.AUTO:
+        if params.use_pos_tags:
+            return constants.TokenizerBackends.SPACY
+        return constants.TokenizerBackends.RULES
+    return backend
+
+
+def get_embedding_dtype(params):
+    """ Returns the numpy dtype to save the word embedding matrix as, int8 for a quantized matrix. """
+    dtype = params.embedding_dtype.lower().strip()
+    if dtype not in (constants.EmbeddingDtypes.FLOAT32, constants.EmbeddingDtypes.FLOAT16,
+                     constants.EmbeddingDtypes.INT8):
+        raise ValueError(constants.ErrorMessages.INVALID_EMBEDDING_DTYPE.format(dtype=dtype))
+    return np.dtype(dtype)
+
+
 def unpack_dict(placeholder_dict, keys=None):
     """ Unpacks a dictionary into a tuple with the values in the same order as the keys given by keys param.
         Args:
@@ -0,0 +1,132 @@
+import os
+import zlib
+import numpy as np
+
+VOCAB_ARRAYS = ('blob', 'offsets', 'buckets', 'ids')
+
+
+class FrozenVocab(object):
+    def __init__(self, blob, offsets, buckets, ids, path=None):
+        """ Compact, immutable vocabulary supporting membership tests and word -> id lookup.
+
+            A Python set of the ~2.2M GloVe words costs hundreds of MB in string objects. Here the vocab is held as
+            four flat arrays forming a hash table in CSR layout: words are UTF-8 encoded and concatenated into a single
+            blob ordered by hash bucket, offsets give the start of each word in the blob, buckets give the first slot
+            of each bucket and ids map each slot back to the words position in the original input. A lookup hashes
+            the word (crc32, stable across processes), then compares the handful of words in its bucket.
+
+            The arrays can be saved with save and memory mapped with load, so a vocab is built once and then shared
+            between runs and worker processes without being parsed or copied.
+
+            Args:
+                blob: uint8 array of the concatenated UTF-8 encoded words.
+                offsets: int64 array of length num_words + 1, start of each word in the blob.
+                buckets: int64 array of length num_buckets + 1, first slot of each bucket.
+                ids: int64 array mapping slots to the position of the word in the input.
+                path: Directory this vocab was loaded from, if any.
+        """
+        self.blob = memoryview(blob)
+        self.offsets = memoryview(offsets)
+        self.buckets = memoryview(buckets)
+        self.ids = memoryview(ids)
+        self.arrays = (blob, offsets, buckets, ids, )
+        self.mask = len(buckets) - 2
+        self.path = path
+
+    @staticmethod
+    def build(words):
+        """ Builds a vocab from an iterable of strings, duplicates keep the id of their first occurrence.
+            Args:
+                words: Iterable of strings.
+            Returns:
+                A FrozenVocab.
+        """
+        encoded = []
+        seen = set()
+
+        for word in words:
+            key = word.encode('utf-8')
+            if key not in seen:
+                seen.add(key)
+                encoded.append(key)
+
+        del seen
+        num_buckets = 1
+        while num_buckets < len(encoded):
+            num_buckets *= 2
+
+        hashes = np.fromiter((zlib.crc32(key) & (num_buckets - 1) for key in encoded), dtype=np.int64,
+                             count=len(encoded))
+        ids = np.argsort(hashes, kind='stable')
+        sorted_hashes = hashes[ids]
+
+        lengths = np.fromiter((len(encoded[i]) for i in ids), dtype=np.int64, count=len(encoded))
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        blob = np.frombuffer(b''.join(encoded[i] for i in ids), dtype=np.uint8)
+        buckets = np.searchsorted(sorted_hashes, np.arange(num_buckets + 1), side='left').astype(np.int64)
+
+        return FrozenVocab(blob, offsets, buckets, ids.astype(np.int64))
+
+    @staticmethod
+    def load(path, mmap=True):
+        """ Loads a vocab saved with save.
+            Args:
+                path: Directory containing the saved vocab arrays.
+                mmap: Whether to memory map the arrays rather than reading them into memory.
+            Returns:
+                A FrozenVocab.
+        """
+        mmap_mode = 'r' if mmap else None
+        arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode) for name in VOCAB_ARRAYS]
+        return FrozenVocab(*arrays, path=path if mmap else None)
+
+    def save(self, path):
+        """ Saves the vocab arrays as .npy files within the directory path. """
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        for name, array in zip(VOCAB_ARRAYS, self.arrays):
+            np.save(os.path.join(path, name + '.npy'), array)
+
+    def find(self, word):
+        """ Returns the hash table slot of word or -1 if it is not in the vocab. """
+        key = word.encode('utf-8')
+        bucket = zlib.crc32(key) & self.mask
+
+        for slot in range(self.buckets[bucket], self.buckets[bucket + 1]):
+            if self.blob[self.offsets[slot]:self.offsets[slot + 1]] == key:
+                return slot
+
+        return -1
+
+    def get(self, word, default=None):
+        """ Returns the position of word in the input the vocab was built from, or default if it isn't present. """
+        slot = self.find(word)
+        if slot < 0:
+            return default
+        return self.ids[slot]
+
+    def __contains__(self, word):
+        return self.find(word) >= 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        """ Iterates over the words in the order they were given to build. """
+        for slot in np.argsort(self.arrays[3]):
+            yield self.blob[self.offsets[slot]:self.offsets[slot + 1]].tobytes().decode('utf-8')
+
+    def __getstate__(self):
+        # Memory mapped vocabs are re-mapped by path rather than copied into the pickle.
+        if self.path is not None:
+            return {'path': self.path}
+        return {'arrays': tuple(np.asarray(array) for array in self.arrays)}
+
+    def __setstate__(self, state):
+        if 'path' in state:
+            vocab = FrozenVocab.load(state['path'])
+        else:
+            vocab = FrozenVocab(*state['arrays'])
+        self.__dict__.update(vocab.__dict__)
@@ -10,17 +10,21 @@ def test(sess_config, params):
     meta_path = util.meta_path(params)
     util.make_dirs([model_dir, log_dir])
 
-    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path))
+    word_vocab_path, _, char_vocab_path, pos_vocab_path = util.vocab_paths(params)
+    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path),
+                                   array_paths=(word_vocab_path, char_vocab_path, pos_vocab_path))
     word_matrix, trainable_matrix, character_matrix = util.load_numpy_files(paths=embedding_paths)
     meta = util.load_json(meta_path)
     num_classes = meta['num_classes']
     num_tags = meta['num_tags']
+    preindexed = meta.get('preindexed', False)
 
     with tf.device('/cpu:0'):
         tables = pipeline.create_lookup_tables(vocabs)
         _, val_tfrecords = util.tf_record_paths(params)
+        val_cache = pipeline.get_eval_cache_path(params, val_tfrecords, preindexed=preindexed)
         val_set, iterator = pipeline.create_pipeline(params, tables, val_tfrecords, num_classes, num_tags,
-                                                     training=False)
+                                                     training=False, preindexed=preindexed, cache_path=val_cache)
 
     with tf.Session(config=sess_config) as sess:
         sess.run(iterator.initializer)
@@ -50,7 +54,7 @@ def test(sess_config, params):
         f1 = metrics.harmonic_mean(precision, recall)
         test_outputs = [recall, precision, f1]
 
-        sess.run(tf.global_variables_initializer())
+        sess.run(tf.global_variables_initializer(), feed_dict=model.embedding.init_feed_dict)
 
         # Restore the moving average version of the learned variables for eval.
         saver = train_utils.get_saver(ema_decay=params.ema_decay, ema_vars_only=True)
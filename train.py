@@ -13,18 +13,26 @@ def train(sess_config, params, debug=False):
 
     util.save_config(params, path=util.config_path(params), overwrite=False)  # Saves the run parameters in a .json
 
-    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path))
+    word_vocab_path, _, char_vocab_path, pos_vocab_path = util.vocab_paths(params)
+    vocabs = util.load_vocab_files(paths=(word_index_path, char_index_path, pos_index_path),
+                                   array_paths=(word_vocab_path, char_vocab_path, pos_vocab_path))
     word_matrix, trainable_matrix, character_matrix = util.load_numpy_files(paths=embedding_paths)
     meta = util.load_json(meta_path)
     num_classes = meta['num_classes']
     num_tags = meta['num_tags']
+    preindexed = meta.get('preindexed', False)
+    examples = util.load_json(util.examples_path(params))
 
     with tf.device('/cpu:0'):
         tables = pipeline.create_lookup_tables(vocabs)
 
         train_tfrecords, val_tfrecords = util.tf_record_paths(params)
-        train_set, train_iter = pipeline.create_pipeline(params, tables, train_tfrecords, num_classes, num_tags, training=True)
-        _, val_iter = pipeline.create_pipeline(params, tables, val_tfrecords, num_classes, num_tags, training=False)
+        train_cache, val_cache = pipeline.get_cache_paths(params, meta, examples, (train_tfrecords, val_tfrecords, ),
+                                                          preindexed=preindexed)
+        train_set, train_iter = pipeline.create_pipeline(params, tables, train_tfrecords, num_classes, num_tags,
+                                                         training=True, preindexed=preindexed, cache_path=train_cache)
+        _, val_iter = pipeline.create_pipeline(params, tables, val_tfrecords, num_classes, num_tags, training=False,
+                                               preindexed=preindexed, cache_path=val_cache)
 
     with tf.Session(config=sess_config) as sess:
         sess.run([tf.tables_initializer(), train_iter.initializer, val_iter.initializer])
@@ -68,7 +76,7 @@ def train(sess_config, params, debug=False):
 
         train_outputs = [recall, precision, f1, train_op]
         val_outputs = [recall, precision, f1]
-        sess.run(tf.global_variables_initializer())
+        sess.run(tf.global_variables_initializer(), feed_dict=model.embedding.init_feed_dict)
         # Saver boilerplate
         writer = tf.summary.FileWriter(log_dir, graph=sess.graph)
         saver = train_utils.get_saver()